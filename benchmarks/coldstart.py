@@ -0,0 +1,96 @@
+"""
+Cold-start cost of the app: time to import it, time until startup completes (when it would be
+marked ready) and the latency of the first dashboard upload and the first report after that.
+
+    python -m benchmarks.coldstart
+    python -m benchmarks.coldstart --runs 10 --modes lazy warmup
+
+Modes:
+    eager   imports the heavy libraries before the app, as every start used to
+    lazy    the default, heavy libraries load on first use
+    warmup  WARMUP=true, libraries, fonts and chart backends are warmed before startup completes
+
+Each run is a fresh interpreter with the offline LLM stand-in.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import configure_offline, print_table
+
+
+MODES = ("eager", "lazy", "warmup")
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "matplotlib.figure", "matplotlib.backends.backend_agg", "reportlab.platypus", "google.genai")
+
+
+async def measure(mode):
+    """Runs inside the child interpreter and prints its measurements as JSON."""
+    import importlib
+
+    import httpx
+
+    from benchmarks.synthetic import synthetic_workbook
+
+    configure_offline(llm_latency=0.05)
+    os.environ["WARMUP"] = "true" if mode == "warmup" else "false"
+    contents = synthetic_workbook(10, 0)
+
+    start = time.perf_counter()
+    if mode == "eager":
+        for name in HEAVY_MODULES:
+            importlib.import_module(name)
+    import main
+    timings = {"import_s": time.perf_counter() - start}
+
+    async with main.app.router.lifespan_context(main.app):
+        timings["ready_s"] = time.perf_counter() - start
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for endpoint, path, field in (("upload", "/uploadfile/", "file"), ("report", "/report", "excel_file")):
+                request_start = time.perf_counter()
+                response = await client.post(path, files={field: ("esg.xlsx", contents)})
+                response.raise_for_status()
+                timings[f"first_{endpoint}_s"] = time.perf_counter() - request_start
+
+    print(json.dumps(timings))
+
+
+def run(mode):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.coldstart", "--measure", mode],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--measure", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        asyncio.run(measure(args.measure))
+        return
+
+    rows = []
+    for mode in args.modes:
+        runs = [run(mode) for _ in range(args.runs)]
+        row = {"mode": mode}
+        for key in runs[0]:
+            row[key.replace("_s", "_ms")] = statistics.median(r[key] for r in runs) * 1000
+        rows.append(row)
+
+    print(f"median of {args.runs} runs\n")
+    print_table(rows, ["mode", "import_ms", "ready_ms", "first_upload_ms", "first_report_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Shared helpers for the benchmark scripts."""
+import os
+import resource
+
+
+# Offline defaults so the benchmarks never reach Gemini, set before the app modules are imported
+OFFLINE_ENV = {
+    "LLM_BACKEND": "fake",
+    "COMPANY": "Example Holdings",
+    "REPORT_TEXT": "Example Holdings is a diversified group committed to responsible growth. " * 40,
+    # Every simulated user shares one address, the per-client limit would reject most of the load
+    "LLM_RATE_LIMIT": "0",
+}
+
+
+def configure_offline(llm_latency, no_cache=False):
+    for key, value in OFFLINE_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ["FAKE_LLM_LATENCY"] = str(llm_latency)
+    os.environ["FAKE_LLM_JITTER"] = str(llm_latency / 4)
+    if no_cache:
+        # Every entry is evicted as soon as it is stored
+        os.environ["CACHE_MAX_ENTRIES"] = "0"
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, q in [0, 100]."""
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies, elapsed=None):
+    summary = {
+        "n": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+    if elapsed:
+        summary["rps"] = len(latencies) / elapsed
+    return summary
+
+
+def peak_rss_mib():
+    """Peak RSS of this process and of the largest reaped child (e.g. pool workers), in MiB."""
+    # ru_maxrss is in KiB on Linux
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    )
+
+
+def print_table(rows, columns):
+    widths = {column: max(len(column), *(len(_format(row.get(column))) for row in rows)) for column in columns}
+    print("  ".join(column.rjust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(_format(row.get(column)).rjust(widths[column]) for column in columns))
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    return "" if value is None else str(value)
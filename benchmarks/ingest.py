@@ -0,0 +1,125 @@
+"""
+Compares the legacy pandas workbook parse with the streaming reader in ingest.py.
+
+    python -m benchmarks.ingest
+    python -m benchmarks.ingest --years 50 --extra-columns 0 500 --extra-sheets 5
+
+Each measurement runs in a fresh interpreter so peak RSS isn't polluted by earlier runs.
+Before timing, every workbook is checked to parse to the same frame with both readers.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def legacy_reader(contents):
+    import pandas as pd
+    xls = pd.ExcelFile(io.BytesIO(contents))
+    return pd.read_excel(xls, 'ESG Metrics')
+
+
+def fast_reader(contents):
+    from ingest import read_esg_metrics
+    return read_esg_metrics(contents, "upload.xlsx")
+
+
+READERS = {"legacy": legacy_reader, "fast": fast_reader}
+
+
+def check_parity(contents):
+    """Raises if the streaming reader's frame differs from pandas' on the columns the API reads."""
+    from pandas.testing import assert_frame_equal
+    from ingest import INGEST_COLUMNS
+
+    legacy = legacy_reader(contents)
+    legacy = legacy[[column for column in legacy.columns if column in INGEST_COLUMNS]]
+    assert_frame_equal(fast_reader(contents), legacy, check_dtype=False)
+
+
+def measure(reader, path, repeat):
+    """Runs inside the child interpreter and prints its measurements as JSON."""
+    with open(path, "rb") as f:
+        contents = f.read()
+
+    import pandas  # noqa: F401, keep import cost out of the parse measurement
+    import openpyxl  # noqa: F401
+    import ingest  # noqa: F401
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = READERS[reader](contents)
+        timings.append(time.perf_counter() - start)
+        del df
+
+    # Both readers pay the same interpreter and import overhead, so peak RSS is comparable as is.
+    # ru_maxrss is in KiB on Linux.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    # Allocation peak of the parse alone, traced in a separate untimed run
+    tracemalloc.start()
+    df = READERS[reader](contents)
+    _, peak_alloc = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(json.dumps({"median_s": statistics.median(timings), "peak_rss_mib": peak_rss, "peak_alloc_mib": peak_alloc / 2 ** 20}))
+
+
+def run(reader, path, repeat):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.ingest", "--measure", reader, path, "--repeat", str(repeat)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=[10, 200])
+    parser.add_argument("--extra-columns", type=int, nargs="+", default=[0, 200])
+    parser.add_argument("--extra-sheets", type=int, default=3)
+    parser.add_argument("--extra-sheet-rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--measure", nargs=2, metavar=("READER", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure, args.repeat)
+        return
+
+    from benchmarks.synthetic import synthetic_workbook
+
+    print(
+        f"{'years':>6} {'extra cols':>10} {'size KiB':>9} | {'legacy ms':>10} {'fast ms':>8} {'speedup':>8} | "
+        f"{'legacy RSS':>10} {'fast RSS':>8} | {'legacy alloc':>12} {'fast alloc':>10}  (MiB)"
+    )
+    for years in args.years:
+        for extra_columns in args.extra_columns:
+            contents = synthetic_workbook(years, extra_columns, args.extra_sheets, args.extra_sheet_rows)
+            check_parity(synthetic_workbook(years, extra_columns, na_cells=True))
+            with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as f:
+                f.write(contents)
+            try:
+                legacy = run("legacy", f.name, args.repeat)
+                fast = run("fast", f.name, args.repeat)
+            finally:
+                os.unlink(f.name)
+
+            print(
+                f"{years:>6} {extra_columns:>10} {len(contents) / 1024:>9.0f} | "
+                f"{legacy['median_s'] * 1000:>10.1f} {fast['median_s'] * 1000:>8.1f} {legacy['median_s'] / fast['median_s']:>7.1f}x | "
+                f"{legacy['peak_rss_mib']:>10.1f} {fast['peak_rss_mib']:>8.1f} | "
+                f"{legacy['peak_alloc_mib']:>12.1f} {fast['peak_alloc_mib']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Load driver for the upload and report endpoints.
+
+By default the app runs in-process behind an ASGI transport with the offline LLM stand-in, so no
+server or Gemini key is needed:
+
+    python -m benchmarks.load --endpoints uploadfile report --requests 40 --concurrency 8
+    python -m benchmarks.load --llm-latency 2 --years 30 --extra-columns 200 --distinct --no-cache
+
+In-process, each endpoint runs in a fresh interpreter so its peak RSS isn't polluted by the others.
+Use --url to drive a running server instead (start it with LLM_BACKEND=fake to stay offline).
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import configure_offline, summarize, peak_rss_mib, print_table
+
+
+ENDPOINTS = {
+    "uploadfile": ("/uploadfile/", "file"),
+    "report": ("/report", "excel_file"),
+}
+
+
+async def drive(client, endpoint, workbooks, requests, concurrency):
+    path, field = ENDPOINTS[endpoint]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(path, files={field: ("esg.xlsx", workbooks[i % len(workbooks)])})
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run(args, endpoints):
+    from benchmarks.synthetic import synthetic_workbook
+
+    count = args.requests if args.distinct else 1
+    workbooks = [synthetic_workbook(args.years, args.extra_columns, seed=i) for i in range(count)]
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+        lifespan = None
+    else:
+        import main
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://benchmark", timeout=None)
+        lifespan = main.app.router.lifespan_context(main.app)
+        await lifespan.__aenter__()
+
+    rows = []
+    try:
+        for endpoint in endpoints:
+            latencies, errors, elapsed = await drive(client, endpoint, workbooks, args.requests, args.concurrency)
+            rows.append({"endpoint": endpoint, "errors": errors, **summarize(latencies, elapsed)})
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    return rows
+
+
+def measure(args):
+    """Runs inside the child interpreter and prints the endpoint's row as JSON."""
+    [row] = asyncio.run(run(args, [args.measure]))
+    # The lifespan doesn't wait for the pool to exit, the workers must be reaped before their RSS is counted
+    for process in multiprocessing.active_children():
+        process.join()
+    row["app_rss_mib"], row["worker_rss_mib"] = peak_rss_mib()
+    print(json.dumps(row))
+
+
+def run_isolated(endpoint):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.load", *sys.argv[1:], "--measure", endpoint],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--extra-columns", type=int, default=0)
+    parser.add_argument("--distinct", action="store_true", help="upload a different workbook with every request")
+    parser.add_argument("--no-cache", action="store_true", help="disable the upload, chart and section caches")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="mean latency of the fake LLM, in seconds")
+    parser.add_argument("--url", help="base URL of a running server, instead of running the app in-process")
+    parser.add_argument("--measure", metavar="ENDPOINT", choices=ENDPOINTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    configure_offline(args.llm_latency, args.no_cache)
+    if args.measure:
+        measure(args)
+        return
+
+    columns = ["endpoint", "n", "errors", "rps", "p50_ms", "p95_ms", "p99_ms"]
+    if args.url:
+        rows = asyncio.run(run(args, args.endpoints))
+    else:
+        rows = [run_isolated(endpoint) for endpoint in args.endpoints]
+        columns += ["app_rss_mib", "worker_rss_mib"]
+    print_table(rows, columns)
+
+
+if __name__ == "__main__":
+    main()
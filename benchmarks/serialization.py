@@ -0,0 +1,68 @@
+"""
+Payload size and encode time of the dashboard response, for the legacy path (jsonable_encoder and
+stdlib json) and the orjson path, in the records and columnar formats and per content encoding.
+
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --years 10 50 200 --iterations 200
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import summarize, print_table
+
+
+def timed(fn, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    return result, latencies
+
+
+def legacy_encode(results):
+    # What FastAPI does with a returned dict; NaN is sent as a bare NaN token here instead of failing
+    from fastapi.encoders import jsonable_encoder
+    return json.dumps(jsonable_encoder(results), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def run(years, iterations):
+    from benchmarks.synthetic import synthetic_frame
+    from metrics import compute_dashboard_metrics
+    from serialization import ENCODINGS, dumps, to_columnar, compress
+
+    results = compute_dashboard_metrics(synthetic_frame(years))
+    encoders = {
+        "legacy records": lambda: legacy_encode(results),
+        "orjson records": lambda: dumps(results),
+        "orjson columnar": lambda: dumps(to_columnar(results)),
+    }
+    encodings = [None, *ENCODINGS]
+
+    rows = []
+    for name, encode in encoders.items():
+        for encoding in encodings:
+            body, latencies = timed(lambda: compress(encode(), encoding), iterations)
+            rows.append({
+                "years": years,
+                "path": name,
+                "encoding": encoding or "identity",
+                "bytes": len(body),
+                **summarize(latencies),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    rows = [row for years in args.years for row in run(years, args.iterations)]
+    print_table(rows, ["years", "path", "encoding", "bytes", "p50_ms", "p95_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Per-stage timings of the upload and report pipelines, run in-process with the offline LLM stand-in.
+
+    python -m benchmarks.stages --iterations 20 --years 30 --extra-columns 100
+
+Stages run directly rather than through the worker pool, and with the caches disabled, so each
+figure is the cost of the stage itself.
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import configure_offline, summarize, peak_rss_mib, print_table
+
+
+STAGES = ("parse", "metrics", "llm", "charts", "pdf")
+
+
+async def call(fn, *args):
+    result = fn(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def timer(timings):
+    """A stage runner appending the duration of each stage to timings[stage]."""
+    async def stage(name, fn, *args):
+        start = time.perf_counter()
+        result = await call(fn, *args)
+        timings[name].append(time.perf_counter() - start)
+        return result
+    return stage
+
+
+def tracer(peaks):
+    """A stage runner recording the allocation peak of each stage on top of what was live before it."""
+    async def stage(name, fn, *args):
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        result = await call(fn, *args)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[name] = (peak - baseline) / 2 ** 20
+        return result
+    return stage
+
+
+async def pipeline(contents, client, stage):
+    """Runs the upload and report stages once on `contents`, each through `stage(name, fn, *args)`."""
+    from ingest import read_esg_metrics
+    from metrics import compute_dashboard_metrics
+    from report import report_chart_specs, build_report_pdf
+    from utils import render_charts_png
+    from generation import generate_sections
+    import main
+
+    df = await stage("parse", read_esg_metrics, contents, "esg.xlsx")
+    await stage("metrics", compute_dashboard_metrics, df)
+
+    context, prompts = main.build_report_prompts(df)
+    sections = await stage("llm", generate_sections, client, prompts, context)
+
+    specs = report_chart_specs(df)
+    flat = [spec for section in specs.values() for spec in section]
+    pngs = iter(await stage("charts", render_charts_png, flat))
+    charts = {title: [next(pngs) for _ in section] for title, section in specs.items()}
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        await stage("pdf", build_report_pdf, sections, charts, path)
+    finally:
+        os.unlink(path)
+
+
+async def run(args):
+    from benchmarks.synthetic import synthetic_workbook
+    from llm import FakeClient
+
+    client = FakeClient(latency=args.llm_latency, jitter=args.llm_latency / 4)
+    timings = {stage: [] for stage in STAGES}
+    peaks = {}
+
+    for i in range(args.iterations):
+        # A new workbook each time keeps every content-keyed cache cold
+        await pipeline(synthetic_workbook(args.years, args.extra_columns, seed=i), client, timer(timings))
+
+    # Allocation peaks are traced in a separate untimed run, tracing slows every allocation down
+    contents = synthetic_workbook(args.years, args.extra_columns, seed=args.iterations)
+    tracemalloc.start()
+    try:
+        await pipeline(contents, client, tracer(peaks))
+    finally:
+        tracemalloc.stop()
+
+    print_table([{"stage": stage, **summarize(values), "peak_alloc_mib": peaks[stage]} for stage, values in timings.items()],
+                ["stage", "n", "p50_ms", "p95_ms", "p99_ms", "peak_alloc_mib"])
+    print(f"\npeak RSS: {peak_rss_mib()[0]:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--extra-columns", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="mean latency of the fake LLM, in seconds")
+    args = parser.parse_args()
+
+    configure_offline(args.llm_latency, no_cache=True)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
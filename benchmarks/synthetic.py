@@ -0,0 +1,68 @@
+"""Synthetic 'ESG Metrics' workbooks for benchmarking."""
+import io
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from ingest import INGEST_COLUMNS, SHEET_NAME
+
+
+HEADCOUNT_COLUMNS = ("Total number of employees", "Employees covered by collective bargaining Persons annual")
+
+
+def synthetic_frame(years=10, extra_columns=0, seed=0):
+    """A frame with every column the API reads plus `extra_columns` unused ones, one row per year."""
+    rng = np.random.default_rng(seed)
+
+    data = {"Year": np.arange(2025 - years, 2025)}
+    for column in sorted(INGEST_COLUMNS - {"Year"}):
+        if column in HEADCOUNT_COLUMNS:
+            values = rng.uniform(500, 5000, years)
+        elif column.startswith("shareholder percentages"):
+            values = rng.uniform(0, 1, years)
+        else:
+            values = rng.uniform(1, 100, years)
+        data[column] = values.round(2)
+
+    for i in range(extra_columns):
+        data[f"Unused metric {i}"] = rng.uniform(0, 1000, years).round(2)
+
+    return pd.DataFrame(data)
+
+
+# Cells pandas reads as NaN, a blank, a placeholder and an empty string
+NA_CELLS = (None, "N/A", "")
+
+
+def synthetic_workbook(years=10, extra_columns=0, extra_sheets=0, extra_sheet_rows=1000, seed=0, na_cells=False):
+    """
+    Bytes of an .xlsx holding the synthetic 'ESG Metrics' sheet and `extra_sheets` unrelated sheets.
+    With `na_cells`, a few metric cells hold NA_CELLS instead of a number, as in hand-filled workbooks.
+    """
+    df = synthetic_frame(years, extra_columns, seed)
+    if na_cells:
+        df = df.astype(object)
+        metric_columns = sorted(INGEST_COLUMNS - {"Year"})
+        for i, value in enumerate(NA_CELLS):
+            df.loc[(i + 1) % years, metric_columns[i * 7 % len(metric_columns)]] = value
+
+    # Not write_only: like Excel, the regular writer puts a <dimension> element at the top of each
+    # sheet, which lets read-only readers size the sheets without scanning them
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    sheet = workbook.create_sheet(SHEET_NAME)
+    sheet.append(list(df.columns))
+    for row in df.itertuples(index=False):
+        sheet.append([value.item() if hasattr(value, "item") else value for value in row])
+
+    rng = np.random.default_rng(seed)
+    for i in range(extra_sheets):
+        sheet = workbook.create_sheet(f"Appendix {i}")
+        sheet.append([f"Column {j}" for j in range(20)])
+        for row in rng.uniform(0, 1000, (extra_sheet_rows, 20)).round(2).tolist():
+            sheet.append(row)
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from importlib.metadata import version
+
+from ingest import INGEST_COLUMNS
+from instrumentation import record_cache_lookup
+from metrics import METRICS
+
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Seconds before a Redis call gives up, an unreachable server then only costs a cache miss
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))
+
+
+def _cache_version():
+    # Entries written by a deploy that parsed other columns, computed other metrics or pickled with
+    # another pandas/numpy no longer match, a shared Redis then simply misses instead of serving them
+    parts = [*sorted(INGEST_COLUMNS), *METRICS, version("pandas"), version("numpy")]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()[:12]
+
+
+CACHE_VERSION = _cache_version()
+
+
+class MemoryBackend:
+    """In-process LRU store with a TTL, an entry limit and a total size limit in bytes."""
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        if len(value) > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self.size += len(value)
+
+            # Evict least recently used entries until we are back within bounds
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+
+class RedisBackend:
+    """Redis (or any Redis-compatible server) store. Memory bounds are left to the server's maxmemory policy."""
+
+    def __init__(self, url=REDIS_URL, ttl=CACHE_TTL, prefix="esg:", timeout=REDIS_TIMEOUT):
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    def get(self, key):
+        return self._redis.get(self.prefix + key)
+
+    def get_many(self, keys):
+        return self._redis.mget([self.prefix + key for key in keys]) if keys else []
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(self.prefix + key, value, ex=ttl or self.ttl)
+
+    def delete(self, key):
+        self._redis.delete(self.prefix + key)
+
+
+def create_backend(name=CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Unknown cache backend: {name}")
+
+
+class UploadCache:
+    """
+    Content-addressed cache for uploaded workbooks.
+
+    Entries are keyed by the SHA-256 of the uploaded bytes plus a kind (e.g. "frame" for the
+    parsed 'ESG Metrics' sheet, "results" for the dashboard payload) and stored pickled, so
+    callers always get a fresh copy they are free to mutate. Keys also carry CACHE_VERSION, so
+    entries from a deploy with other columns, metrics or library versions are never read back.
+
+    Values are unpickled as they come back from the backend. With Redis, anyone able to write to
+    that server can therefore run code in the app, it must be reachable by this app only.
+
+    Lookups and stores run on a thread, since a remote backend blocks on the network and
+    (un)pickling a frame isn't free either.
+    """
+
+    def __init__(self, backend=None, version=CACHE_VERSION):
+        self.backend = backend or create_backend()
+        self.version = version
+
+    @staticmethod
+    def digest(contents):
+        return hashlib.sha256(contents).hexdigest()
+
+    async def get(self, digest, kind):
+        return (await self.get_many([digest], kind))[0]
+
+    async def get_many(self, digests, kind):
+        """Looks up several entries of one kind in a single round trip, None for each miss."""
+        return await asyncio.to_thread(self._get_many, digests, kind)
+
+    async def set(self, digest, kind, value):
+        await asyncio.to_thread(self._set, digest, kind, value)
+
+    def _get_many(self, digests, kind):
+        try:
+            values = self.backend.get_many([self._key(digest, kind) for digest in digests])
+        except Exception:
+            # A cache outage should only cost us the cache, never the request
+            values = [None] * len(digests)
+
+        for value in values:
+            record_cache_lookup(kind, value is not None)
+        return [None if value is None else pickle.loads(value) for value in values]
+
+    def _set(self, digest, kind, value):
+        try:
+            self.backend.set(self._key(digest, kind), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            pass
+
+    def _key(self, digest, kind):
+        return f"{kind}:{self.version}:{digest}"
+
+
+upload_cache = UploadCache()
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+
+from instrumentation import llm_call, record_llm_usage, record_cache_lookup
+
+
+logger = logging.getLogger(__name__)
+
+MODEL = "gemini-2.5-flash"
+COMPANY_PROFILE_TTL = float(os.getenv("COMPANY_PROFILE_TTL", "86400"))
+COMPANY_PROFILE_MAX_ENTRIES = int(os.getenv("COMPANY_PROFILE_MAX_ENTRIES", "1000"))
+
+PROFILE_FIELDS = ("name", "website", "headquarters_location", "size", "industry", "description")
+
+_FENCED_JSON = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+
+def parse_company_profile(text):
+    """Extracts and validates the company profile JSON object from a model response."""
+    match = _FENCED_JSON.search(text)
+    if match:
+        text = match.group(1)
+    else:
+        # Unfenced response, take the outermost object
+        start, end = text.find("{"), text.rfind("}")
+        if start != -1 and end > start:
+            text = text[start:end + 1]
+
+    profile = json.loads(text)
+    if not isinstance(profile, dict):
+        raise ValueError(f"Expected a JSON object for the company profile, got {type(profile).__name__}")
+    if not any(field in profile for field in PROFILE_FIELDS):
+        raise ValueError(f"Company profile has none of the expected fields: {', '.join(PROFILE_FIELDS)}")
+
+    return {field: profile.get(field) for field in PROFILE_FIELDS}
+
+
+class CompanyProfileCache:
+    """
+    Stale-while-revalidate cache of the Gemini company lookup.
+
+    Fresh entries are served directly. Once an entry is older than the TTL it is still served,
+    while a single background task fetches a replacement. Only a cold miss waits on the model.
+    At most `max_entries` companies are kept, the least recently used are dropped first.
+    """
+
+    def __init__(self, ttl=COMPANY_PROFILE_TTL, max_entries=COMPANY_PROFILE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._profiles = OrderedDict()
+        self._refreshes = {}
+
+    async def get(self, client, company):
+        profile = self.get_nowait(client, company)
+        if profile is None:
+            return await self.refresh(client, company)
+        return profile
+
+    def get_nowait(self, client, company):
+        """Like get(), but a cold miss returns None at once and fetches the profile in the background."""
+        entry = self._profiles.get(company)
+        record_cache_lookup("company_profile", entry is not None)
+        if entry is None:
+            self._refresh_task(client, company)
+            return None
+
+        self._profiles.move_to_end(company)
+        fetched_at, profile = entry
+        if time.monotonic() - fetched_at > self.ttl:
+            self._refresh_task(client, company)
+        return profile
+
+    def warm(self, client, company):
+        """Starts fetching the profile in the background, e.g. at startup."""
+        self._refresh_task(client, company)
+
+    def refresh(self, client, company):
+        """Returns an awaitable for a fresh profile, sharing one in-flight lookup per company."""
+        return asyncio.shield(self._refresh_task(client, company))
+
+    def _refresh_task(self, client, company):
+        task = self._refreshes.get(company)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(client, company))
+            self._refreshes[company] = task
+            task.add_done_callback(lambda _: self._refreshes.pop(company, None))
+            task.add_done_callback(self._log_failure)
+        return task
+
+    async def _fetch(self, client, company):
+        prompt = f"""
+        Give me this information (name, website, headquarters_location, size(number of employees), industry, description) for {company} in JSON format
+        """
+        with llm_call("llm_company_profile"):
+            response = await client.aio.models.generate_content(model=MODEL, contents=prompt)
+        record_llm_usage("llm_company_profile", response)
+        profile = parse_company_profile(response.text)
+        self._profiles[company] = (time.monotonic(), profile)
+        self._profiles.move_to_end(company)
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+        return profile
+
+    @staticmethod
+    def _log_failure(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Company profile refresh failed: %s", task.exception())
+
+
+company_profiles = CompanyProfileCache()
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import time
+import weakref
+
+from cache import upload_cache
+from instrumentation import llm_call, record_llm_usage
+
+
+logger = logging.getLogger(__name__)
+
+MODEL = "gemini-2.5-flash"
+
+# Tunables for the report generation engine, overridable from the environment
+SECTION_CONCURRENCY = int(os.getenv("REPORT_SECTION_CONCURRENCY", "5"))
+SECTION_TIMEOUT = float(os.getenv("REPORT_SECTION_TIMEOUT", "90"))
+SECTION_RETRIES = int(os.getenv("REPORT_SECTION_RETRIES", "2"))
+SECTION_BACKOFF = float(os.getenv("REPORT_SECTION_BACKOFF", "1.0"))
+CONTEXT_CACHE_TTL = int(os.getenv("REPORT_CONTEXT_CACHE_TTL", "3600"))
+
+# Shared across requests so that concurrent reports don't multiply the load on Gemini.
+# One per event loop, a semaphore can't be used from a loop other than the one it first waited on.
+_semaphores = weakref.WeakKeyDictionary()
+
+# Rate limited or timed out at the API, worth another try like any 5xx
+RETRYABLE_STATUS_CODES = {408, 429}
+
+# Gemini context caches by hash of the shared context: (name or None if caching failed, expiry)
+_context_caches = {}
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(SECTION_CONCURRENCY)
+    return semaphore
+
+
+def _hash(*parts):
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def _retryable(e):
+    """Timeouts, rate limiting, server errors and dropped connections are transient. A bad key, an invalid or blocked prompt are not."""
+    import httpx
+    from google.genai import errors
+
+    if isinstance(e, (asyncio.TimeoutError, ConnectionError, httpx.TransportError, errors.ServerError)):
+        return True
+    return isinstance(e, errors.APIError) and e.code in RETRYABLE_STATUS_CODES
+
+
+async def _generate(client, contents, model, config=None):
+    """Generates content, retrying transient failures with exponential backoff."""
+    for attempt in range(SECTION_RETRIES + 1):
+        try:
+            async with _semaphore():
+                with llm_call("llm_section"):
+                    response = await asyncio.wait_for(
+                        client.aio.models.generate_content(model=model, contents=contents, config=config),
+                        timeout=SECTION_TIMEOUT,
+                    )
+            record_llm_usage("llm_section", response)
+            return response.text
+        except Exception as e:
+            if attempt == SECTION_RETRIES or not _retryable(e):
+                if isinstance(e, asyncio.TimeoutError):
+                    raise TimeoutError(f"timed out after {SECTION_TIMEOUT:g}s") from e
+                raise
+
+            delay = SECTION_BACKOFF * 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, delay))
+
+
+async def cached_context(client, context, model=MODEL):
+    """
+    Returns the name of a Gemini context cache holding `context`, creating it if needed.
+    Returns None when the context can't be cached (e.g. it is under the model's minimum size),
+    in which case callers send the context inline.
+    """
+    from google.genai import types
+
+    key = _hash(model, context)
+    entry = _context_caches.get(key)
+    if entry is not None and entry[1] > time.monotonic():
+        return entry[0]
+
+    try:
+        cache = await client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=[context],
+                display_name="esg-report-context",
+                ttl=f"{CONTEXT_CACHE_TTL}s",
+            ),
+        )
+        name = cache.name
+    except Exception as e:
+        logger.info("Context caching unavailable, sending the report context inline: %s", e)
+        name = None
+
+    # Expire a little early so we never reference a cache Gemini has already dropped
+    _context_caches[key] = (name, time.monotonic() + CONTEXT_CACHE_TTL * 0.9)
+    return name
+
+
+async def generate_sections(client, prompts, context="", model=MODEL):
+    """
+    Generates all sections concurrently, returning them in the order of `prompts`.
+
+    `context` is the source material shared by every section. It is uploaded once as a Gemini
+    context cache where possible instead of being repeated in each prompt. Generated sections are
+    cached by (section, prompt hash, model), so unchanged inputs never hit the model twice.
+    """
+    keys = {title: _hash(title, _hash(context, prompt), model) for title, prompt in prompts.items()}
+    sections = dict(zip(keys, await upload_cache.get_many(list(keys.values()), "section")))
+
+    missing = [title for title, text in sections.items() if text is None]
+    if not missing:
+        return sections
+
+    from google.genai import types
+
+    cache_name = await cached_context(client, context, model) if context else None
+    config = types.GenerateContentConfig(cached_content=cache_name) if cache_name else None
+
+    async def generate(title):
+        prompt = prompts[title]
+        try:
+            if config is not None:
+                text = await _generate(client, prompt, model, config)
+            else:
+                text = await _generate(client, f"{context}\n\n{prompt}" if context else prompt, model)
+        except Exception as e:
+            if config is not None:
+                # The context cache may have been dropped server-side, recreate it on the next report
+                _context_caches.pop(_hash(model, context), None)
+            # Fallback for failed generations, not cached so the next report retries
+            return f"Content generation failed for this section. Error: {e}"
+
+        await upload_cache.set(keys[title], "section", text)
+        return text
+
+    texts = await asyncio.gather(*(generate(title) for title in missing))
+    sections.update(zip(missing, texts))
+    return sections
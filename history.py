@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+
+from metrics import compute_dashboard_snapshot, append_dashboard_metrics
+
+
+# Any SQLAlchemy URL, SQLite keeps the history next to the app for local development
+HISTORY_URL = os.getenv("HISTORY_URL", "sqlite:///esg_history.db")
+
+
+class HistoryStore:
+    """
+    Per-company store of the yearly ESG metrics and of the dashboard computed from them.
+
+    Each year is one row holding that year's column values. The dashboard payload is kept
+    precomputed next to the years, together with the running state (latest year, last values,
+    column sums) that lets a newly appended year update it without re-reading the history.
+    Reading a dashboard is then a single row lookup.
+    """
+
+    def __init__(self, url=HISTORY_URL):
+        self.url = url
+        self._engine = None
+        self._tables = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            import sqlalchemy as sa
+
+            metadata = sa.MetaData()
+            years = sa.Table(
+                "esg_years", metadata,
+                sa.Column("company", sa.String(255), primary_key=True),
+                sa.Column("year", sa.Integer, primary_key=True),
+                sa.Column("values", sa.JSON, nullable=False),
+            )
+            dashboards = sa.Table(
+                "esg_dashboards", metadata,
+                sa.Column("company", sa.String(255), primary_key=True),
+                sa.Column("latest_year", sa.Integer, nullable=False),
+                sa.Column("results", sa.JSON, nullable=False),
+                sa.Column("state", sa.JSON, nullable=False),
+                sa.Column("updated_at", sa.Float, nullable=False),
+            )
+
+            engine = sa.create_engine(self.url)
+            metadata.create_all(engine)
+            self._tables = years, dashboards
+            self._engine = engine
+        return self._engine
+
+    @property
+    def tables(self):
+        """The (years, dashboards) tables, created on first use."""
+        if self._tables is None:
+            self.engine
+        return self._tables
+
+    def dashboard(self, company):
+        """The precomputed dashboard payload of `company`, None if it has no history."""
+        _, dashboards = self.tables
+        with self.engine.connect() as connection:
+            return connection.scalar(dashboards.select().with_only_columns(dashboards.c.results).where(dashboards.c.company == company))
+
+    def frame(self, company):
+        """The stored history of `company` as an 'ESG Metrics' frame, one row per year, None if there is none."""
+        import pandas as pd
+
+        rows = self._rows(company)
+        return pd.DataFrame.from_records(rows) if rows else None
+
+    def replace(self, company, df):
+        """Replaces the whole history of `company` with the years in `df` and returns its dashboard."""
+        df = df.sort_values("Year")
+        results, state = compute_dashboard_snapshot(df)
+        rows = df.to_dict(orient='records')
+
+        with self._lock, self.engine.begin() as connection:
+            years, _ = self.tables
+            connection.execute(years.delete().where(years.c.company == company))
+            connection.execute(years.insert(), [_year_row(company, row) for row in rows])
+            self._save_dashboard(connection, company, rows[-1]["Year"], results, state)
+        return results
+
+    def append_year(self, company, row):
+        """
+        Adds or replaces one year of `company`'s metrics, `row` mapping columns to values including 'Year',
+        and returns the updated dashboard. A year after the latest stored one updates the dashboard
+        incrementally, a correction or backfill of an earlier year recomputes it from the history.
+        """
+        row = {**row, "Year": int(row["Year"])}
+
+        with self._lock, self.engine.begin() as connection:
+            years, dashboards = self.tables
+            current = connection.execute(dashboards.select().where(dashboards.c.company == company)).first()
+
+            if current is not None and row["Year"] > current.latest_year:
+                results, state = append_dashboard_metrics(current.results, current.state, row)
+                connection.execute(years.insert(), [_year_row(company, row)])
+            else:
+                import pandas as pd
+
+                connection.execute(years.delete().where((years.c.company == company) & (years.c.year == row["Year"])))
+                connection.execute(years.insert(), [_year_row(company, row)])
+                rows = self._rows(company, connection)
+                results, state = compute_dashboard_snapshot(pd.DataFrame.from_records(rows))
+
+            latest_year = row["Year"] if current is None else max(row["Year"], current.latest_year)
+            self._save_dashboard(connection, company, latest_year, results, state)
+        return results
+
+    def delete(self, company):
+        with self._lock, self.engine.begin() as connection:
+            years, dashboards = self.tables
+            connection.execute(years.delete().where(years.c.company == company))
+            connection.execute(dashboards.delete().where(dashboards.c.company == company))
+
+    def _rows(self, company, connection=None):
+        years, _ = self.tables
+        query = years.select().with_only_columns(years.c["values"]).where(years.c.company == company).order_by(years.c.year)
+        if connection is not None:
+            return list(connection.scalars(query))
+        with self.engine.connect() as connection:
+            return list(connection.scalars(query))
+
+    def _save_dashboard(self, connection, company, latest_year, results, state):
+        _, dashboards = self.tables
+        connection.execute(dashboards.delete().where(dashboards.c.company == company))
+        connection.execute(dashboards.insert(), [{
+            "company": company, "latest_year": int(latest_year),
+            "results": results, "state": state, "updated_at": time.time(),
+        }])
+
+
+def _year_row(company, row):
+    return {"company": company, "year": int(row["Year"]), "values": row}
+
+
+history_store = HistoryStore()
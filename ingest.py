@@ -0,0 +1,122 @@
+import io
+import os
+
+from instrumentation import stage
+from metrics import required_columns, COMPARISON_COLUMNS
+from report import CHART_COLUMNS
+
+
+SHEET_NAME = 'ESG Metrics'
+
+# Every column the dashboard, the report charts and the batch comparison read. Anything else in
+# an upload is never looked at, so it isn't converted or kept in memory either.
+INGEST_COLUMNS = frozenset(required_columns() | CHART_COLUMNS | set(COMPARISON_COLUMNS))
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+UPLOAD_EXTENSIONS = EXCEL_EXTENSIONS + ('.csv', '.parquet')
+
+NAN = float('nan')
+
+
+def _convert_value(value, na_values):
+    # Same cell conversion as pandas' openpyxl reader: integral floats become ints, errors and
+    # pandas' default NA strings ("N/A", "", "null", ...) NaN
+    if isinstance(value, str) and value in na_values:
+        return NAN
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def read_xlsx(contents, columns=INGEST_COLUMNS):
+    """
+    Streams the 'ESG Metrics' sheet, keeping only `columns`.
+
+    The workbook is opened read-only, so no other worksheet is parsed and the sheet is read row
+    by row, converting only the cells of the wanted columns.
+    """
+    import pandas as pd
+    from pandas._libs.parsers import STR_NA_VALUES
+    from openpyxl import load_workbook
+    from openpyxl.cell.cell import ERROR_CODES
+
+    # values_only drops the cell types, error cells come through as their code ("#DIV/0!", ...)
+    na_values = STR_NA_VALUES | set(ERROR_CODES)
+
+    workbook = load_workbook(io.BytesIO(contents), read_only=True, data_only=True, keep_links=False)
+    try:
+        if SHEET_NAME not in workbook.sheetnames:
+            raise ValueError(f"Worksheet named '{SHEET_NAME}' not found")
+
+        sheet = workbook[SHEET_NAME]
+        # The stored dimensions can be wrong depending on the writer, pandas doesn't trust them either
+        sheet.reset_dimensions()
+
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, ())
+
+        # A name repeated in the header keeps its first column, pandas would rename the rest (X.1, ...)
+        wanted = {}
+        for index, name in enumerate(header):
+            if name in columns and name not in wanted.values():
+                wanted[index] = name
+
+        # As in pandas, blank rows become NaN rows except trailing ones, which are dropped. A row
+        # counts as blank only if it is empty in every column, not just the wanted ones.
+        data = {name: [] for name in wanted.values()}
+        blank_rows = 0
+        for row in rows:
+            if all(value is None for value in row):
+                blank_rows += 1
+                continue
+
+            for index, name in wanted.items():
+                value = row[index] if index < len(row) else None
+                column_values = data[name]
+                column_values.extend([NAN] * blank_rows)
+                column_values.append(NAN if value is None else _convert_value(value, na_values))
+            blank_rows = 0
+    finally:
+        workbook.close()
+
+    return pd.DataFrame(data)
+
+
+def read_csv(contents, columns=INGEST_COLUMNS):
+    import pandas as pd
+
+    return pd.read_csv(io.BytesIO(contents), usecols=lambda name: name in columns)
+
+
+def read_parquet(contents, columns=INGEST_COLUMNS):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet uploads require the optional pyarrow package.")
+
+    parquet = pq.ParquetFile(io.BytesIO(contents))
+    return parquet.read(columns=[name for name in parquet.schema_arrow.names if name in columns]).to_pandas()
+
+
+def read_esg_metrics(contents, filename):
+    """Reads the ESG metrics of an upload into a frame, picking the reader from the file extension."""
+    with stage("parse"):
+        return _read_esg_metrics(contents, filename)
+
+
+def _read_esg_metrics(contents, filename):
+    extension = os.path.splitext(filename)[1].lower()
+
+    if extension == '.xlsx':
+        return read_xlsx(contents)
+    if extension == '.csv':
+        return read_csv(contents)
+    if extension == '.parquet':
+        return read_parquet(contents)
+    if extension == '.xls':
+        # Legacy binary workbooks have no streaming reader, let pandas pick the engine
+        import pandas as pd
+
+        return pd.read_excel(io.BytesIO(contents), SHEET_NAME, usecols=lambda name: name in INGEST_COLUMNS)
+
+    raise ValueError(f"Unsupported file type: {extension or filename}")
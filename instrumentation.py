@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from starlette.routing import Match
+
+
+# Adds a Server-Timing header with the stage breakdown to every response, off by default
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+# Wide enough for both a sub-millisecond cache lookup and a slow Gemini call
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HTTP_REQUESTS = Counter("esg_http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_DURATION = Histogram("esg_http_request_duration_seconds", "Time until the response body completes", ["method", "route"], buckets=BUCKETS)
+HTTP_IN_FLIGHT = Gauge("esg_http_requests_in_flight", "HTTP requests being handled", ["method", "route"])
+
+STAGE_DURATION = Histogram("esg_stage_duration_seconds", "Time spent in each pipeline stage", ["stage"], buckets=BUCKETS)
+
+LLM_IN_FLIGHT = Gauge("esg_llm_requests_in_flight", "Gemini calls awaiting a response")
+LLM_REQUESTS = Counter("esg_llm_requests_total", "Gemini calls", ["operation", "outcome"])
+LLM_TOKENS = Counter("esg_llm_tokens_total", "Gemini tokens by kind, as reported in the response usage metadata", ["operation", "kind"])
+
+# hit ratio: rate(esg_cache_requests_total{result="hit"}[5m]) / rate(esg_cache_requests_total[5m])
+CACHE_REQUESTS = Counter("esg_cache_requests_total", "Upload cache lookups", ["kind", "result"])
+
+# "leader" calls started a computation, "shared" ones joined one already in flight for the same upload
+SINGLE_FLIGHT_REQUESTS = Counter("esg_single_flight_requests_total", "Coalesced computations", ["kind", "result"])
+RATE_LIMITED = Counter("esg_rate_limited_requests_total", "Requests rejected by the per-client rate limiter", ["limiter"])
+
+WORKER_PENDING = Gauge("esg_worker_jobs_pending", "Worker pool jobs running or queued")
+
+USAGE_FIELDS = {
+    "prompt": "prompt_token_count",
+    "candidates": "candidates_token_count",
+    "cached": "cached_content_token_count",
+    "thoughts": "thoughts_token_count",
+}
+
+# Stage timings of the current request, for the Server-Timing header
+_request_stages = ContextVar("request_stages", default=None)
+
+# Stage timings recorded inside a worker, shipped back to the event loop process with the result
+_worker = threading.local()
+
+
+def record_stage(name, seconds):
+    stages = getattr(_worker, "stages", None)
+    if stages is not None:
+        stages.append((name, seconds))
+        return
+
+    STAGE_DURATION.labels(name).observe(seconds)
+    request_stages = _request_stages.get()
+    if request_stages is not None:
+        request_stages.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    """Times the enclosed block as pipeline stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def run_collecting_stages(fn, args):
+    """Worker pool entry point, returns the result of `fn(*args)` with the stage timings it recorded."""
+    _worker.stages = []
+    try:
+        return fn(*args), _worker.stages
+    finally:
+        _worker.stages = None
+
+
+@contextmanager
+def llm_call(operation):
+    """Times a Gemini call and counts it by outcome."""
+    LLM_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        LLM_IN_FLIGHT.dec()
+        record_stage(operation, time.perf_counter() - start)
+        LLM_REQUESTS.labels(operation, outcome).inc()
+
+
+def record_llm_usage(operation, response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+
+    for kind, field in USAGE_FIELDS.items():
+        count = getattr(usage, field, None)
+        if count:
+            LLM_TOKENS.labels(operation, kind).inc(count)
+
+
+def record_cache_lookup(kind, hit):
+    CACHE_REQUESTS.labels(kind, "hit" if hit else "miss").inc()
+
+
+def record_single_flight(kind, shared):
+    SINGLE_FLIGHT_REQUESTS.labels(kind, "shared" if shared else "leader").inc()
+
+
+def record_rate_limited(limiter):
+    RATE_LIMITED.labels(limiter).inc()
+
+
+def render_metrics():
+    """Returns the Prometheus text exposition of every metric, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def _route_name(app, scope):
+    # Label by route template rather than raw path, so path parameters don't explode the series
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+def _server_timing(stages):
+    # Repeated stages (e.g. one per report section) are summed into a single entry
+    totals = {}
+    for name, seconds in stages:
+        duration, count = totals.get(name, (0.0, 0))
+        totals[name] = (duration + seconds, count + 1)
+    return ", ".join(
+        f'{name};dur={duration * 1000:.1f}' + (f';desc="{count} calls"' if count > 1 else "")
+        for name, (duration, count) in totals.items()
+    )
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware counting and timing every HTTP request by route.
+
+    Optionally adds a Server-Timing header listing the stages recorded while the response was
+    being prepared. For streamed responses only the stages finished before the headers went out
+    are included.
+    """
+
+    def __init__(self, app, server_timing=SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        route = _route_name(scope["app"], scope)
+        stages = []
+        token = _request_stages.set(stages)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing and stages:
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", _server_timing(stages).encode())]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_DURATION.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            _request_stages.reset(token)
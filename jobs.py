@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+
+
+logger = logging.getLogger(__name__)
+
+REPORT_JOB_TTL = float(os.getenv("REPORT_JOB_TTL", "3600"))
+
+
+def new_report_path():
+    """Creates an empty temporary file for a PDF report and returns its path."""
+    fd, path = tempfile.mkstemp(prefix="esg-report-", suffix=".pdf")
+    os.close(fd)
+    return path
+
+
+def remove_file(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def link_file(source, path):
+    """Replaces `path` with a hard link to `source`, or with a copy where hard links aren't supported."""
+    remove_file(path)
+    try:
+        os.link(source, path)
+    except OSError:
+        shutil.copyfile(source, path)
+
+
+@dataclass
+class ReportJob:
+    id: str
+    path: str
+    status: str = "pending"
+    error: str = None
+    created_at: float = field(default_factory=time.monotonic)
+    finished_at: float = None
+
+
+class ReportJobs:
+    """
+    In-process registry of background report jobs.
+
+    Each job writes its PDF to a temporary file. Finished jobs, and their files, are dropped
+    `ttl` seconds after completion.
+    """
+
+    def __init__(self, ttl=REPORT_JOB_TTL):
+        self.ttl = ttl
+        self._jobs = {}
+        self._tasks = set()
+
+    def submit(self, write_report):
+        """Starts `write_report(path)` in the background and returns the job tracking it."""
+        self._expire()
+
+        job = ReportJob(id=uuid.uuid4().hex, path=new_report_path())
+        self._jobs[job.id] = job
+
+        task = asyncio.ensure_future(self._run(job, write_report))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id):
+        self._expire()
+        return self._jobs.get(job_id)
+
+    async def _run(self, job, write_report):
+        job.status = "running"
+        try:
+            await write_report(job.path)
+            job.status = "done"
+        except Exception as e:
+            logger.exception("Report job %s failed", job.id)
+            job.status = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+            remove_file(job.path)
+        finally:
+            job.finished_at = time.monotonic()
+
+    def clear(self):
+        for task in self._tasks:
+            task.cancel()
+        for job in self._jobs.values():
+            remove_file(job.path)
+        self._jobs.clear()
+
+    def _expire(self):
+        now = time.monotonic()
+        for job in list(self._jobs.values()):
+            if job.finished_at is not None and now - job.finished_at > self.ttl:
+                del self._jobs[job.id]
+                remove_file(job.path)
+
+
+report_jobs = ReportJobs()
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import os
+import random
+import time
+import types
+import uuid
+
+
+# "gemini" talks to the real API, "fake" uses the offline stand-in below for load tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "1.0"))
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.25"))
+FAKE_LLM_FAILURE_RATE = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))
+
+FAKE_PARAGRAPH = (
+    "During the reporting period the company continued to embed sustainability across its operations, "
+    "strengthening governance oversight, reducing its environmental footprint and investing in its people. "
+    "Progress against the targets set out in the previous report is summarised below."
+)
+
+
+class FakeResponse:
+    def __init__(self, prompt, text):
+        self.text = text
+        self.usage_metadata = types.SimpleNamespace(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+        )
+
+
+class FakeModels:
+    """Offline stand-in for genai's models API, with a configurable latency and failure rate."""
+
+    def __init__(self, latency, jitter, failure_rate):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+
+    def _delay(self):
+        return max(0.0, random.gauss(self.latency, self.jitter))
+
+    def _respond(self, contents):
+        if random.random() < self.failure_rate:
+            from google.genai import errors
+            # A transient error, like an overloaded model, so the retry path is exercised too
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "Simulated LLM failure", "status": "UNAVAILABLE"}})
+
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+        if "JSON format" in prompt:
+            profile = {
+                "name": "Example Holdings", "website": "https://example.com",
+                "headquarters_location": "Baku, Azerbaijan", "size": 1200,
+                "industry": "Financial Services", "description": "A synthetic company profile.",
+            }
+            return FakeResponse(prompt, f"```json\n{json.dumps(profile)}\n```")
+
+        return FakeResponse(prompt, "\n".join([FAKE_PARAGRAPH] * 3))
+
+
+class FakeSyncModels(FakeModels):
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self._delay())
+        return self._respond(contents)
+
+
+class FakeAsyncModels(FakeModels):
+    async def generate_content(self, model, contents, config=None):
+        await asyncio.sleep(self._delay())
+        return self._respond(contents)
+
+
+class FakeAsyncCaches:
+    async def create(self, model, config=None):
+        return types.SimpleNamespace(name=f"cachedContents/{uuid.uuid4().hex}")
+
+
+class FakeClient:
+    """Drop-in for genai.Client covering the calls this app makes."""
+
+    def __init__(self, latency=FAKE_LLM_LATENCY, jitter=FAKE_LLM_JITTER, failure_rate=FAKE_LLM_FAILURE_RATE):
+        self.models = FakeSyncModels(latency, jitter, failure_rate)
+        self.aio = types.SimpleNamespace(
+            models=FakeAsyncModels(latency, jitter, failure_rate),
+            caches=FakeAsyncCaches(),
+        )
+
+
+def llm_configured():
+    return LLM_BACKEND == "fake" or bool(os.getenv("GEMINI_API_KEY"))
+
+
+def create_client(backend=LLM_BACKEND):
+    if backend == "fake":
+        return FakeClient()
+    if backend == "gemini":
+        from google import genai
+        return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    raise ValueError(f"Unknown LLM backend: {backend}")
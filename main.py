@@ -1,36 +1,69 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, Request, UploadFile, File, Form, Body, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware  # type: ignore
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, FileResponse, Response
+from starlette.background import BackgroundTask
 
-import pandas as pd
+import anyio
+import asyncio
 import io
+import zipfile
+from collections import Counter
+from typing import Literal
 
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.enums import TA_CENTER
-from reportlab.platypus.flowables import PageBreak
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-
-
-import math
-import json
-
-from google import genai
+from contextlib import asynccontextmanager
 
+import logging
 import os
 
 from dotenv import load_dotenv
 
-from utils import create_line_chart, create_pie_chart, create_bar_chart
+# Loaded before the app modules below, which read their settings at import time
+load_dotenv()
 
+from metrics import compute_dashboard_metrics, compare_companies, metrics_summary
+from ingest import read_esg_metrics, UPLOAD_EXTENSIONS
+from report import report_chart_specs, build_report_pdf
+from utils import chart_key, render_charts_png
+from workers import worker_pool
+from generation import generate_sections
+from cache import upload_cache
+from company import company_profiles
+from jobs import report_jobs, new_report_path, remove_file, link_file
+from history import history_store
+from llm import create_client, llm_configured
+from instrumentation import MetricsMiddleware, render_metrics
+from serialization import DashboardResponse, dumps, to_columnar
+from singleflight import single_flight
+from ratelimit import llm_rate_limiter
+from warmup import WARMUP, warm_up
+
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Built here rather than at import, so a missing or bad key only disables the LLM features
+    try:
+        app.state.client = create_client()
+    except Exception as e:
+        logger.warning("LLM client unavailable, company profiles and reports are disabled: %s", e)
+        app.state.client = None
 
+    # Warm the company profile so dashboard uploads never wait on the model in steady state
+    if app.state.client is not None and os.getenv("COMPANY"):
+        company_profiles.warm(app.state.client, os.getenv("COMPANY"))
 
-load_dotenv()
+    if WARMUP:
+        await anyio.to_thread.run_sync(warm_up)
+        await worker_pool.warm(warm_up)
+    yield
+    report_jobs.clear()
+    worker_pool.shutdown()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 app.add_middleware(
@@ -41,331 +74,454 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so request timings include every other middleware
+app.add_middleware(MetricsMiddleware)
 
-def calculate_percentage_change(df, column_name):
-    df['percentage_change'] = df[column_name].pct_change() * 100
-    df['percentage_change'] = df['percentage_change'].where(pd.notna(df['percentage_change']), 0)
-    return df[['Year', 'percentage_change']].to_dict(orient='records')
 
+async def load_esg_metrics(contents, digest, filename):
+    # Identical uploads arriving together share one parse
+    return await single_flight.run(("frame", digest), lambda: _load_esg_metrics(contents, digest, filename))
 
-def labor_rights_compliance_score(df):
-    safety_weighted = (
-        df["Accident Fatal"].sum() * 10
-        + df["Accident Serious"].sum() * 3
-        + df["Accident Minor"].sum() * 1
-    )
 
-    # scale by total employees (approx using last row of bargaining employees as proxy)
-    total_employees = df["Employees covered by collective bargaining Persons annual"].iloc[-1]
-    safety_score = max(0, 100 - (safety_weighted / total_employees) * 1000)  # scaling factor 1000 chosen
-
-    # ---- Diversity Score ----
-    board_women = 20        # from your data
-    management_women = 61.6 # from your data
-    board_score = 100 - abs(50 - board_women)
-    management_score = 100 - abs(50 - management_women)
-    diversity_score = (board_score + management_score) / 2
-
-    # ---- Wellness Score ----
-    covered = df["Employees covered by collective bargaining Persons annual"].iloc[-1]
-    wellness_score = (covered / total_employees) * 100
-
-    # ---- Turnover Score ----
-    turnover = df["Voluntary Employee Turnover Rate  % annual"].iloc[-1]
-    turnover_score = 100 - abs(turnover - 5)
-
-    # ---- Final Compliance Score ----
-    compliance_score = (
-        0.4 * safety_score +
-        0.2 * diversity_score +
-        0.2 * wellness_score +
-        0.2 * turnover_score
-    )
+async def _load_esg_metrics(contents, digest, filename):
+    df = await upload_cache.get(digest, "frame")
+    if df is None:
+        df = await worker_pool.run(read_esg_metrics, contents, filename)
+        await upload_cache.set(digest, "frame", df)
+    return df
+
+
+async def render_report_charts(df):
+    """
+    Renders the report charts in parallel on the worker pool, reusing cached images.
+    Misses are split into one batch per worker so a report never takes more than its share of the queue.
+    """
+    specs = report_chart_specs(df)
+    keys = {chart_key(spec): spec for section in specs.values() for spec in section}
+    pngs = dict(zip(keys, await upload_cache.get_many(list(keys), "chart")))
+
+    missing = [key for key, png in pngs.items() if png is None]
+    batches = [missing[i::max(worker_pool.processes, 1)] for i in range(max(worker_pool.processes, 1))]
+    rendered = await asyncio.gather(*(
+        worker_pool.run(render_charts_png, [keys[key] for key in batch]) for batch in batches if batch
+    ))
+    for batch, batch_pngs in zip([batch for batch in batches if batch], rendered):
+        for key, png in zip(batch, batch_pngs):
+            pngs[key] = png
+            await upload_cache.set(key, "chart", png)
+
+    return {title: [pngs[chart_key(spec)] for spec in section] for title, section in specs.items()}
+
 
-    return int(compliance_score)
+async def load_dashboard_results(contents, digest, filename):
+    results = await single_flight.run(("results", digest), lambda: _load_dashboard_results(contents, digest, filename))
+    # Shared by every request that joined the computation, each gets its own copy to add to
+    return dict(results)
 
 
+async def _load_dashboard_results(contents, digest, filename):
+    # A repeat upload of the same workbook skips parsing and metric computation entirely
+    results = await upload_cache.get(digest, "results")
+    if results is None:
+        df = await load_esg_metrics(contents, digest, filename)
+        results = await worker_pool.run(compute_dashboard_metrics, df)
+        await upload_cache.set(digest, "results", results)
+    return results
+
+
+async def company_overview(company=None):
+    """Profile of `company`, by default the one this deployment is configured for."""
+    if app.state.client is None:
+        return None
+    return await company_profiles.get(app.state.client, company or os.getenv("COMPANY"))
+
+
+async def stored_company_overview(company, wait=True):
+    """
+    Best-effort profile of a company with a stored history, a failed lookup leaves it out rather than
+    failing the request. With `wait` false a profile that isn't cached yet is fetched in the background.
+    """
+    if app.state.client is None:
+        return None
+    try:
+        if not wait:
+            return company_profiles.get_nowait(app.state.client, company)
+        return await company_profiles.get(app.state.client, company)
+    except Exception as e:
+        logger.warning("Company profile lookup failed for %s: %s", company, e)
+        return None
+
+
+def dashboard_response(request, results, format):
+    if format == "columnar":
+        results = to_columnar(results)
+    return DashboardResponse(results, request.headers.get("accept-encoding", ""))
+
 
 @app.post("/uploadfile/")
 async def create_upload_file(
-    file: UploadFile = File(...)
+    request: Request,
+    file: UploadFile = File(...),
+    format: Literal["records", "columnar"] = "records",
     ):
+    """
+    Returns the dashboard payload of a workbook. With `format=columnar` the year by year series
+    are sent as one array per column rather than a list of records.
+    """
 
 
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        return JSONResponse(status_code=400, content={"message": "Invalid file type. Please upload an Excel file."})
+    if not file.filename.endswith(UPLOAD_EXTENSIONS):
+        return JSONResponse(status_code=400, content={"message": "Invalid file type. Please upload an Excel, CSV or Parquet file."})
 
     try:
         contents = await file.read()
-        xls = pd.ExcelFile(io.BytesIO(contents))
-
-        results = {}
-        df = pd.read_excel(xls, 'ESG Metrics')
-        results['water_usage_change'] = calculate_percentage_change(df, 'Water Usage (m3)')
-        results['water_usage'] = df[["Year", "Water Usage (m3)"]].to_dict(orient='records')
-
-        results['employee_safety_change'] = calculate_percentage_change(df, 'Employee Safety (accidents)')
-
-        results['waste_recycled_change'] = calculate_percentage_change(df, 'Waste Recycled (tons)')
-        results['waste_unrecycled_change'] = calculate_percentage_change(df, 'Waste Unrecycled (tons)')
-        waste_data = df[["Year", "Waste Recycled (tons)", "Waste Unrecycled (tons)"]].to_dict(orient='records')
-        results['waste_recycled'] = waste_data
-        latest_waste = waste_data[-1]  # assumes chronological order
-        results['waste_recycled_latest'] = [
-            {"name": "Recycled", "value": latest_waste["Waste Recycled (tons)"], "color": "#10B981"},
-            {"name": "Unrecycled", "value": latest_waste["Waste Unrecycled (tons)"], "color": "#F59E0B"}
-        ]
-
-        results['carbon_emissions_change'] = calculate_percentage_change(df, 'Carbon Emissions (tons CO2e)')
-        results['carbon_emissions_renewable_change'] = calculate_percentage_change(df, 'Carbon Emissions Renewable (%)')
-        results['carbon_emissions_nonrenewable_change'] = calculate_percentage_change(df, 'Carbon Emissions Non-Renewable (%)')
-        results['carbon_emissions'] = df[["Year", "Carbon Emissions Renewable (%)", "Carbon Emissions Non-Renewable (%)"]].to_dict(orient='records')
-
-        energy_data = df[["Year", "Energy Renewable (%)", "Energy Non-Renewable (%)"]].to_dict(orient='records')
-        results['energy_usage'] = energy_data
-
-        latest_energy = energy_data[-1]  # assumes chronological order
-        results['energy_usage_latest'] = [
-            {"name": "Renewable", "value": latest_energy["Energy Renewable (%)"], "color": "#10B981"},
-            {"name": "Non-Renewable", "value": latest_energy["Energy Non-Renewable (%)"], "color": "#EF4444"}
-        ]
-
-        results['energy_renewable_change'] = calculate_percentage_change(df, 'Energy Renewable (%)')
-        results['energy_nonrenewable_change'] = calculate_percentage_change(df, 'Energy Non-Renewable (%)')
-
-        results['safety_data'] = [
-            {"type" : "Fatal", "count": int(df["Accident Fatal"].sum()), "color": "#EF4444"},
-            {"type" : "Serious", "count": int(df[["Accident Serious"]].sum()), "color": "#F59E0B"},
-            {"type" : "Minor", "count": int(df[["Accident Minor"]].sum()), "color": "#10B981"},
-        ]
-
-        results['diversity_data'] = [
-            {
-                "category": "Board",
-                "men": df['Board members (male) as % of total'].tail(1).values[0],
-                "women": df['Board members (female) as % of total'].tail(1).values[0],
-                "minority": df['Board members (minority) as % of total'].tail(1).values[0]
-            },
-            {
-                "category": "Management",
-                "men": df['Employees in all management positions (male) % annual'].tail(1).values[0],
-                "women": df['Employees in all management positions (female) % annual'].tail(1).values[0],
-                "minority": df['Employees in all management positions (minority) % annual'].tail(1).values[0]
-            }
-        ]
-
-        results["wellness_data"] = df[["Year", "Employees covered by collective bargaining Persons annual"]].to_dict(orient='records')
-        
-        lrcs = labor_rights_compliance_score(df)
-        results["labor_rights_compliance_score"] = lrcs
-
-        results["gender_diversity_board"] = [
-            { "name": "Female", "value": df["Board members (female) as % of total"].tail(1).values[0], "color": "#EC4899", "description": "Women board members" },
-            { "name": "Male", "value": df["Board members (male) as % of total"].tail(1).values[0], "color": "#3B82F6", "description": "Men board members" },
-            { "name": "Minority", "value": df["Board members (minority) as % of total"].tail(1).values[0], "color": "#f6f03bff", "description": "Minority board members" },
-        ]
-       
-        results["anti_corruption_training"] = math.floor(100 * (df["Employees Trained (Anti-Corruption)"].tail(1).values[0] / df["Total number of employees"].tail(1).values[0]))
-        
-        results["disability_representation"] = math.floor(100 * (df["Board members with disabilities"].tail(1).values[0] / df["Total number of employees"].tail(1).values[0]))
-        
-        results["education_diversity_data"] = [
-                { "name": "Business/MBA", "value": int(df["Board education Business"].tail(1).values[0]), 
-                 "color": "#3B82F6", "description": "Business/MBA background" },
-
-                { "name": "Law", "value": int(df["Board education Law"].tail(1).values[0]), 
-                 "color": "#EC4899", "description": "Legal background" },
-
-                { "name": "Engineering/Tech", "value": int(df["Board education Engineering"].tail(1).values[0]),
-                 "color": "#10B981", "description": "Engineering/Technology" },
-
-                { "name": "Finance", "value": int(df["Board education Finance/Econ"].tail(1).values[0]),
-                 "color": "#F59E0B", "description": "Finance background" },
-                 
-                { "name": "Other", "value": int(df["Board education Others"].tail(1).values[0]),
-                 "color": "#6B7280", "description": "Other educational backgrounds" },
-            ]
-        
-        results["age_group_composition"] = [
-            { "name": "30-45", "value": int(df["Age-group composition 30-45"].tail(1).values[0]),
-             "color": "#06B6D4", "description": "Ages 30-45" },
-             
-            { "name": "46-60", "value": int(df["Age-group composition 46-60"].tail(1).values[0]),
-             "color": "#8B5CF6", "description": "Ages 46-60" },
-
-            { "name": "61+", "value": int(df["Age-group composition 61+"].tail(1).values[0]),
-             "color": "#F59E0B", "description": "Ages 61+" },
-        ]
-
-        ethnic_diversity_data_aze = df["Board ethnicity-AZE"].tail(1).values[0]
-        results["ethnic_diversity_data"] = [
-            { "name": "Azerbaijani", "value": ethnic_diversity_data_aze,
-             "color": "#8B5CF6", "description": "Azerbaijani" },
-
-            { "name": "Others", "value": round(100 - ethnic_diversity_data_aze, 1), 
-             "color": "#F59E0B", "description": "Others" },
-        ]
-
-
-        shareholder_data_raw = df[["Year",
-            "shareholder percentages (broad composition).Pension fund",
-            "shareholder percentages (broad composition). Ataturk shares", 
-            "shareholder percentages (broad composition). Free float",
-        ]].to_dict(orient='records')
-    
-        shareholder_data = []
-        for item in shareholder_data_raw:
-            shareholder_data.append({
-                "Year": item["Year"],
-                "Pension fund": item["shareholder percentages (broad composition).Pension fund"] * 100,
-                "Ataturk shares": item["shareholder percentages (broad composition). Ataturk shares"] * 100,
-                "Free float": item["shareholder percentages (broad composition). Free float"] * 100,
-            })
-        
-        
-        results["shareholder_rights_data"] = shareholder_data
-
-
-        prompt = f"""
-        Give me this information (name, website, headquarters_location, size(number of employees), industry, description) for {os.getenv("COMPANY")} in JSON format
-        """
-        response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
-        results["company_overview"] = json.loads(response.candidates[0].content.parts[0].text.strip("`")[4:].strip())
-
-        return results
+        results = await load_dashboard_results(contents, upload_cache.digest(contents), file.filename)
 
+        results["company_overview"] = await company_overview()
+
+        return dashboard_response(request, results, format)
+
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"message": f"There was an error processing the file: {e}"})
     
 
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
-@app.post("/report")
-async def generate_esg_report(
-    excel_file: UploadFile = File(...),
-):
-    report_text = os.getenv("REPORT_TEXT")
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+# Total uncompressed size of the workbooks in a batch, checked before anything is decompressed
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(256 * 1024 * 1024)))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(max(worker_pool.processes, 1))))
+
+
+class BatchTooLarge(ValueError):
+    pass
+
+
+def _check_batch_limits(count, size, max_files, max_bytes):
+    if count > max_files:
+        raise BatchTooLarge(f"Too many workbooks, at most {BATCH_MAX_FILES} are accepted per batch.")
+    if size > max_bytes:
+        raise BatchTooLarge(f"Batch too large, at most {BATCH_MAX_BYTES / (1024 * 1024):g} MiB of workbooks are accepted per batch.")
+
+
+def extract_workbooks(filename, contents, max_files=BATCH_MAX_FILES, max_bytes=BATCH_MAX_BYTES):
+    """
+    Returns (company, filename, contents) for an uploaded workbook, or for every workbook inside an uploaded zip.
+    Raises BatchTooLarge if there are more than `max_files` workbooks or more than `max_bytes` of them
+    uncompressed, going by the zip's index so an oversized archive is rejected before any of it is read.
+    """
+    if not filename.endswith('.zip'):
+        _check_batch_limits(1, len(contents), max_files, max_bytes)
+        return [(os.path.splitext(os.path.basename(filename))[0], filename, contents)]
+
+    with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+        members = []
+        for member in archive.infolist():
+            name = os.path.basename(member.filename)
+            # Skip anything that isn't a workbook, e.g. readmes, OS metadata and Excel lock files
+            if member.is_dir() or name.startswith(('.', '~$')) or not name.endswith(UPLOAD_EXTENSIONS):
+                continue
+            members.append((name, member))
+
+        _check_batch_limits(len(members), sum(member.file_size for _, member in members), max_files, max_bytes)
+        return [(os.path.splitext(name)[0], name, archive.read(member)) for name, member in members]
+
+
+async def process_batch_workbook(company, filename, contents, semaphore):
+    if not filename.endswith(UPLOAD_EXTENSIONS):
+        return company, {"company": company, "error": "Invalid file type. Please upload an Excel, CSV or Parquet file."}, None
+
+    try:
+        async with semaphore:
+            digest = upload_cache.digest(contents)
+            df = await load_esg_metrics(contents, digest, filename)
+            results = await load_dashboard_results(contents, digest, filename)
+        return company, {"company": company, "results": results}, df
+    except Exception as e:
+        return company, {"company": company, "error": f"There was an error processing the file: {getattr(e, 'detail', e)}"}, None
+
+
+async def stream_batch_results(workbooks):
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    frames = {}
+
+    for task in asyncio.as_completed([process_batch_workbook(*workbook, semaphore) for workbook in workbooks]):
+        company, line, df = await task
+        if df is not None:
+            frames[company] = df
+        yield dumps(line) + b"\n"
+
+    comparison = await worker_pool.run(compare_companies, frames) if frames else []
+    yield dumps({"comparison": comparison}) + b"\n"
+
 
-    if not os.getenv("GEMINI_API_KEY"):
+@app.post("/uploadfile/batch")
+async def create_upload_files(
+    files: list[UploadFile] = File(...)
+    ):
+    """
+    Processes many workbooks, or zips of workbooks, one company per workbook named after the file.
+    Results are streamed back as NDJSON, one line per company as it finishes, followed by a final
+    line holding the cross-company comparison table.
+    """
+    workbooks = []
+    size = 0
+    try:
+        for file in files:
+            contents = await file.read()
+            # The limits apply to the whole batch, each file gets what the earlier ones left
+            workbooks.extend(await asyncio.to_thread(
+                extract_workbooks, file.filename, contents, BATCH_MAX_FILES - len(workbooks), BATCH_MAX_BYTES - size,
+            ))
+            size = sum(len(workbook) for _, _, workbook in workbooks)
+    except zipfile.BadZipFile as e:
+        return JSONResponse(status_code=400, content={"message": f"Invalid zip archive: {e}"})
+    except BatchTooLarge as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+
+    # Company names come from the file names, so they have to be unique within a batch
+    names = Counter(company for company, _, _ in workbooks)
+    duplicates = sorted(name for name, count in names.items() if count > 1)
+    if duplicates:
+        return JSONResponse(status_code=400, content={"message": f"Duplicate company names in batch: {', '.join(duplicates)}"})
+
+    return StreamingResponse(stream_batch_results(workbooks), media_type="application/x-ndjson")
+
+
+@app.post("/companies/{company}/history", dependencies=[Depends(llm_rate_limiter)])
+async def replace_company_history(
+    request: Request,
+    company: str,
+    file: UploadFile = File(...)
+    ):
+    """Stores the full year by year history of a company from a workbook, replacing any earlier one, and returns its dashboard."""
+    if not file.filename.endswith(UPLOAD_EXTENSIONS):
+        return JSONResponse(status_code=400, content={"message": "Invalid file type. Please upload an Excel, CSV or Parquet file."})
+
+    try:
+        contents = await file.read()
+        df = await load_esg_metrics(contents, upload_cache.digest(contents), file.filename)
+        results = await asyncio.to_thread(history_store.replace, company, df)
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"There was an error processing the file: {e}"})
+
+    results["company_overview"] = await stored_company_overview(company)
+    return dashboard_response(request, results, "records")
+
+
+@app.post("/companies/{company}/years", dependencies=[Depends(llm_rate_limiter)])
+async def append_company_year(
+    request: Request,
+    company: str,
+    row: dict = Body(...),
+    ):
+    """
+    Adds one year of metrics, a JSON object of column values including 'Year', to a stored history
+    and returns the updated dashboard. Only the new year is sent and processed, not the whole workbook.
+    """
+    if "Year" not in row:
+        raise HTTPException(status_code=400, detail="The 'Year' column is required.")
+
+    try:
+        results = await asyncio.to_thread(history_store.append_year, company, row)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Missing metric column: {e}")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid metric values: {e}")
+
+    results["company_overview"] = await stored_company_overview(company)
+    return dashboard_response(request, results, "records")
+
+
+@app.get("/companies/{company}/dashboard")
+async def get_company_dashboard(
+    request: Request,
+    company: str,
+    format: Literal["records", "columnar"] = "records",
+    ):
+    """
+    Serves the precomputed dashboard of a stored history, in the same formats as /uploadfile/.
+    The company profile is served from cache only, so reading a dashboard never waits on the model.
+    """
+    results = await asyncio.to_thread(history_store.dashboard, company)
+    if results is None:
+        raise HTTPException(status_code=404, detail="No history stored for this company.")
+
+    results["company_overview"] = await stored_company_overview(company, wait=False)
+    return dashboard_response(request, results, format)
+
+
+@app.delete("/companies/{company}/history", status_code=204)
+async def delete_company_history(company: str):
+    await asyncio.to_thread(history_store.delete, company)
+
+
+REPORT_CHUNK_SIZE = 64 * 1024
+REPORT_HEADERS = {"Content-Disposition": "attachment; filename=ESG_Report.pdf"}
+
+REPORT_SECTIONS = {
+    "Executive Summary / CEO Letter": "Write a compelling executive summary and CEO letter. Focus on the purpose, company vision, sustainability strategy, and key highlights.",
+    "About the Company": "Provide a detailed business overview, including the company's mission, values, and the relevance of ESG to its business model. Use the provided text as the basis.",
+    "Materiality Assessment": "Describe the stakeholder engagement process and identify the most relevant ESG issues for the company. Include a high-level overview of the materiality assessment.",
+    "Governance": "Detail the company's governance structure, including board oversight of ESG, risk management, and ethics policies. Use the provided text to describe risk management, ethics policies, and compliance.",
+    "Environmental": "Summarize the company's environmental strategy, including climate change goals, GHG emissions, and energy use. Incorporate specific targets and achievements from the provided text and the metrics data.",
+    "Social": "Write about the company's social responsibility, including workforce well-being, DEI efforts, and community engagement. Use the provided text to highlight key initiatives and achievements.",
+    "Performance Metrics & Targets": "Present key ESG performance metrics and targets. Use the provided quantitative data to create a quantitative summary. Mention specific targets from the text.",
+    "Case Studies / Highlights": "Describe the company's success stories or flagship initiatives. Use the provided text to detail the operational resilience and sustainable lending case studies.",
+    "Assurance & Verification": "Explain the process of external assurance and verification of ESG data. Include any relevant certifications or third-party reviews mentioned in the provided text.",
+    "Appendices": "Outline the content of the appendices, including methodology, glossary, and alignment with global standards like GRI and SASB, based on the provided text."
+}
+
+
+async def read_report_workbook(excel_file):
+    if not llm_configured() or app.state.client is None:
         raise HTTPException(status_code=500, detail="API key is not configured. Please set the GEMINI_API_KEY environment variable.")
 
     try:
         file_contents = await excel_file.read()
-        xls = pd.ExcelFile(io.BytesIO(file_contents))
-
-        df = pd.read_excel(xls, 'ESG Metrics')
+        digest = upload_cache.digest(file_contents)
+        return await load_esg_metrics(file_contents, digest, excel_file.filename), digest
 
-        df_json = df.to_json(orient='records')
-        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to process the uploaded file: {str(e)}")
 
-    sections = {
-        "Executive Summary / CEO Letter": "Write a compelling executive summary and CEO letter. Focus on the purpose, company vision, sustainability strategy, and key highlights.",
-        "About the Company": "Provide a detailed business overview, including the company's mission, values, and the relevance of ESG to its business model. Use the provided text as the basis.",
-        "Materiality Assessment": "Describe the stakeholder engagement process and identify the most relevant ESG issues for the company. Include a high-level overview of the materiality assessment.",
-        "Governance": "Detail the company's governance structure, including board oversight of ESG, risk management, and ethics policies. Use the provided text to describe risk management, ethics policies, and compliance.",
-        "Environmental": "Summarize the company's environmental strategy, including climate change goals, GHG emissions, and energy use. Incorporate specific targets and achievements from the provided text and the metrics data.",
-        "Social": "Write about the company's social responsibility, including workforce well-being, DEI efforts, and community engagement. Use the provided text to highlight key initiatives and achievements.",
-        "Performance Metrics & Targets": "Present key ESG performance metrics and targets. Use the data from the provided JSON to create a quantitative summary. Mention specific targets from the text.",
-        "Case Studies / Highlights": "Describe the company's success stories or flagship initiatives. Use the provided text to detail the operational resilience and sustainable lending case studies.",
-        "Assurance & Verification": "Explain the process of external assurance and verification of ESG data. Include any relevant certifications or third-party reviews mentioned in the provided text.",
-        "Appendices": "Outline the content of the appendices, including methodology, glossary, and alignment with global standards like GRI and SASB, based on the provided text."
+
+def build_report_prompts(df):
+    """Returns the context shared by every section and the per-section prompts."""
+    report_text = os.getenv("REPORT_TEXT")
+
+    # Shared by every section, sent once through Gemini context caching where available
+    context = (
+        f"The following source text and data are the basis for the sections of a corporate ESG report.\n\n"
+        f"Source Text:\n{report_text}\n\n"
+        f"Quantitative Data:\n{metrics_summary(df)}"
+    )
+
+    prompts = {
+        title: (
+            f"Write the '{title}' section of the corporate ESG report, based on the source text and data provided.\n\n"
+            f"Section Instructions:\n{prompt}\n\n"
+            f"Ensure the output is a well-structured paragraph or set of paragraphs, suitable for a professional report."
+        )
+        for title, prompt in REPORT_SECTIONS.items()
     }
 
-    report_sections = {}
-
-    for title, prompt in sections.items():
-        try:
-            full_prompt = (
-                f"Based on the following source text and data, write the '{title}' section of a corporate ESG report.\n\n"
-                f"Source Text:\n{report_text}\n\n"
-                f"Quantitative Data (JSON):\n{df_json}\n\n"
-                f"Section Instructions:\n{prompt}\n\n"
-                f"Ensure the output is a well-structured paragraph or set of paragraphs, suitable for a professional report."
-            )
-            response = client.models.generate_content(model="gemini-2.5-flash", contents=full_prompt)
-            report_sections[title] = response.text
-        except Exception as e:
-            # Fallback for failed generations
-            report_sections[title] = f"Content generation failed for this section. Error: {e}"
-
-    # PDF Generation
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    
-    # Define styles for the document
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('TitleStyle', parent=styles['Heading1'], spaceAfter=12, alignment=TA_CENTER)
-    heading_style = styles['Heading2']
-    paragraph_style = styles['Normal']
-    
-    flowables = []
-    
-    # Title Page
-    flowables.append(Paragraph("ESG Report", title_style))
-    flowables.append(Paragraph("A Comprehensive Analysis", ParagraphStyle('SubTitleStyle', parent=styles['Normal'], alignment=TA_CENTER, fontSize=16)))
-    flowables.append(Spacer(1, 48))
-    flowables.append(PageBreak())
-    
-    # Add sections to the PDF
-    for title, content in report_sections.items():
-        flowables.append(Paragraph(title, heading_style))
-        flowables.append(Spacer(1, 6))
-        
-        # Split content into paragraphs for better formatting
-        for para in content.split('\n'):
-            if para.strip():
-                flowables.append(Paragraph(para.strip(), paragraph_style))
-                flowables.append(Spacer(1, 6))
-        
-        # Add charts for specific sections
-        if title == "Environmental":
-            if 'Year' in df.columns and 'Carbon Emissions (tons CO2e)' in df.columns:
-                chart1 = create_line_chart(df, 'Year', 'Carbon Emissions (tons CO2e)', 'Total Carbon Emissions Over Time', 'Tons CO2e')
-                flowables.append(Image(chart1, width=400, height=300))
-                flowables.append(Spacer(1, 12))
-            if 'Year' in df.columns and 'Water Usage (m3)' in df.columns:
-                chart2 = create_line_chart(df, 'Year', 'Water Usage (m3)', 'Water Usage Over Time', 'Cubic Meters (m3)')
-                flowables.append(Image(chart2, width=400, height=300))
-                flowables.append(Spacer(1, 12))
-            
-        if title == "Social":
-            if 'Board members (female) as % of total' in df.columns and 'Board members (male) as % of total' in df.columns:
-                df_last_year = df.iloc[-1]
-                labels = ['Female', 'Male']
-                sizes = [df_last_year['Board members (female) as % of total'], df_last_year['Board members (male) as % of total']]
-                chart3 = create_pie_chart(labels, sizes, 'Board Gender Composition')
-                flowables.append(Image(chart3, width=400, height=300))
-                flowables.append(Spacer(1, 12))
-            
-            if 'Age-group composition 30-45' in df.columns and 'Age-group composition 46-60' in df.columns and 'Age-group composition 61+' in df.columns:
-                df_last_year = df.iloc[-1]
-                labels = ['30-45', '46-60', '61+']
-                sizes = [df_last_year['Age-group composition 30-45'], df_last_year['Age-group composition 46-60'], df_last_year['Age-group composition 61+']]
-                chart4 = create_pie_chart(labels, sizes, 'Age Group Composition')
-                flowables.append(Image(chart4, width=400, height=300))
-                flowables.append(Spacer(1, 12))
-
-        if title == "Performance Metrics & Targets":
-            if 'Year' in df.columns and 'Energy Renewable (%)' in df.columns and 'Energy Non-Renewable (%)' in df.columns:
-                chart5 = create_bar_chart(df, 'Year', ['Energy Renewable (%)', 'Energy Non-Renewable (%)'], 'Energy Source Composition Over Time')
-                flowables.append(Image(chart5, width=400, height=300))
-                flowables.append(Spacer(1, 12))
-
-            if 'Year' in df.columns and 'Accident Minor' in df.columns and 'Accident Serious' in df.columns:
-                chart6 = create_bar_chart(df, 'Year', ['Accident Minor', 'Accident Serious'], 'Safety Incidents Over Time')
-                flowables.append(Image(chart6, width=400, height=300))
-                flowables.append(Spacer(1, 12))
-
-        flowables.append(Spacer(1, 18))
-
-    doc.build(flowables)
-    
-    # Move buffer position to the beginning and return
-    buffer.seek(0)
-    return StreamingResponse(buffer, media_type="application/pdf", headers={
-        "Content-Disposition": "attachment; filename=ESG_Report.pdf"
-    })
+    return context, prompts
+
+
+async def write_esg_report(df, digest, path):
+    """
+    Writes the PDF report for `df`, the workbook with content hash `digest`, to `path`.
+    Concurrent requests for the same workbook share one generation and each get a link to its PDF.
+    """
+    async with single_flight.join(("report", digest), lambda: render_esg_report(df), release=remove_file) as shared_path:
+        await asyncio.to_thread(link_file, shared_path, path)
+
+
+async def render_esg_report(df):
+    """Generates the report sections and charts for `df` and writes the PDF to a new temporary file, returning its path."""
+    path = new_report_path()
+    try:
+        await _render_esg_report(df, path)
+    except BaseException:
+        remove_file(path)
+        raise
+    return path
+
+
+async def _render_esg_report(df, path):
+    context, prompts = build_report_prompts(df)
+
+    # Charts only depend on the workbook, so they render while the sections are generated
+    charts_task = asyncio.ensure_future(render_report_charts(df))
+    report_sections = await generate_sections(app.state.client, prompts, context)
+    charts = await charts_task
+
+    # PDF Generation, the chart images are handed over to the worker and released once placed
+    await worker_pool.run(build_report_pdf, report_sections, charts, path)
+
+
+async def stream_esg_report(df, digest):
+    # The file is only created once the response starts, a client leaving before that leaves nothing behind
+    path = new_report_path()
+    try:
+        await write_esg_report(df, digest, path)
+        async with await anyio.open_file(path, "rb") as pdf:
+            while chunk := await pdf.read(REPORT_CHUNK_SIZE):
+                yield chunk
+    finally:
+        remove_file(path)
+
+
+@app.post("/report", dependencies=[Depends(llm_rate_limiter)])
+async def generate_esg_report(
+    excel_file: UploadFile = File(...),
+    stream: bool = False,
+):
+    """
+    Generates the PDF report. The PDF is spooled to a temporary file and sent in chunks.
+    With `stream=true` the response starts as soon as the upload is validated instead of once the PDF is ready,
+    at the cost of errors past that point surfacing as a truncated download rather than a status code.
+    """
+    df, digest = await read_report_workbook(excel_file)
+    if stream:
+        return StreamingResponse(stream_esg_report(df, digest), media_type="application/pdf", headers=REPORT_HEADERS)
+
+    path = new_report_path()
+    try:
+        await write_esg_report(df, digest, path)
+    except BaseException:
+        remove_file(path)
+        raise
+
+    return FileResponse(path, media_type="application/pdf", headers=REPORT_HEADERS, background=BackgroundTask(remove_file, path))
+
+
+@app.post("/report/jobs", status_code=202, dependencies=[Depends(llm_rate_limiter)])
+async def create_report_job(
+    excel_file: UploadFile = File(...),
+):
+    """Starts generating the report in the background. Poll the returned job id, then download the PDF."""
+    df, digest = await read_report_workbook(excel_file)
+    job = report_jobs.submit(lambda path: write_esg_report(df, digest, path))
+    return {"job_id": job.id, "status": job.status}
+
+
+def get_report_job_or_404(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found or expired.")
+    return job
+
+
+@app.get("/report/jobs/{job_id}")
+async def get_report_job(job_id: str):
+    job = get_report_job_or_404(job_id)
+    return {"job_id": job.id, "status": job.status, "error": job.error}
+
+
+@app.get("/report/jobs/{job_id}/pdf")
+async def download_report_job(job_id: str):
+    job = get_report_job_or_404(job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Report is not ready, job status is '{job.status}'.")
+    return FileResponse(job.path, media_type="application/pdf", headers=REPORT_HEADERS)
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    content, content_type = render_metrics()
+    return Response(content, media_type=content_type)
+
 
+@app.get("/health", include_in_schema=False)
+def get_health():
+    """Readiness probe, only served once startup (including any warm-up) has finished."""
+    return {"status": "ok"}
@@ -0,0 +1,447 @@
+import math
+from dataclasses import dataclass, field
+
+from instrumentation import stage
+
+
+# --- Metric Specs ---
+#
+# Every key of the dashboard payload is declared in METRICS below together with the columns it
+# reads and how they are transformed. compute_dashboard_metrics() then evaluates them all against
+# a single MetricContext, so pct-changes, the latest row and the column totals are each computed
+# once per upload no matter how many metrics use them.
+
+@dataclass(frozen=True)
+class Latest:
+    """Value of `column` in the latest year, optionally passed through `fn`."""
+    column: str
+    fn: object = None
+
+
+@dataclass(frozen=True)
+class Total:
+    """Sum of `column` over all years, as an int."""
+    column: str
+
+
+@dataclass(frozen=True)
+class PctChange:
+    """Year over year percentage change of `column`, 0 for the first year."""
+    column: str
+
+
+@dataclass(frozen=True)
+class Series:
+    """Year by year records of `columns`, optionally renamed and scaled."""
+    columns: tuple
+    rename: dict = field(default_factory=dict)
+    scale: float = 1
+
+
+@dataclass(frozen=True)
+class Share:
+    """Latest `numerator` as a floored percentage of the latest `denominator`."""
+    numerator: str
+    denominator: str
+
+
+@dataclass(frozen=True)
+class Template:
+    """JSON structure in which Latest and Total references are replaced by their values."""
+    template: object
+
+
+@dataclass(frozen=True)
+class Score:
+    """Custom score computed from the context by `fn`, reading `columns`."""
+    fn: object
+    columns: tuple
+
+
+def labor_rights_compliance_score(ctx):
+    safety_weighted = (
+        ctx.totals["Accident Fatal"] * 10
+        + ctx.totals["Accident Serious"] * 3
+        + ctx.totals["Accident Minor"] * 1
+    )
+
+    # scale by total employees (approx using last row of bargaining employees as proxy)
+    total_employees = ctx.latest["Employees covered by collective bargaining Persons annual"]
+    safety_score = max(0, 100 - (safety_weighted / total_employees) * 1000)  # scaling factor 1000 chosen
+
+    # ---- Diversity Score ----
+    board_women = ctx.latest["Board members (female) as % of total"]
+    management_women = ctx.latest["Employees in all management positions (female) % annual"]
+    board_score = 100 - abs(50 - board_women)
+    management_score = 100 - abs(50 - management_women)
+    diversity_score = (board_score + management_score) / 2
+
+    # ---- Wellness Score ----
+    covered = ctx.latest["Employees covered by collective bargaining Persons annual"]
+    wellness_score = (covered / total_employees) * 100
+
+    # ---- Turnover Score ----
+    turnover = ctx.latest["Voluntary Employee Turnover Rate  % annual"]
+    turnover_score = 100 - abs(turnover - 5)
+
+    # ---- Final Compliance Score ----
+    compliance_score = (
+        0.4 * safety_score +
+        0.2 * diversity_score +
+        0.2 * wellness_score +
+        0.2 * turnover_score
+    )
+
+    return int(compliance_score)
+
+
+METRICS = {
+    "water_usage_change": PctChange("Water Usage (m3)"),
+    "water_usage": Series(("Water Usage (m3)",)),
+
+    "employee_safety_change": PctChange("Employee Safety (accidents)"),
+
+    "waste_recycled_change": PctChange("Waste Recycled (tons)"),
+    "waste_unrecycled_change": PctChange("Waste Unrecycled (tons)"),
+    "waste_recycled": Series(("Waste Recycled (tons)", "Waste Unrecycled (tons)")),
+    "waste_recycled_latest": Template([
+        {"name": "Recycled", "value": Latest("Waste Recycled (tons)"), "color": "#10B981"},
+        {"name": "Unrecycled", "value": Latest("Waste Unrecycled (tons)"), "color": "#F59E0B"},
+    ]),
+
+    "carbon_emissions_change": PctChange("Carbon Emissions (tons CO2e)"),
+    "carbon_emissions_renewable_change": PctChange("Carbon Emissions Renewable (%)"),
+    "carbon_emissions_nonrenewable_change": PctChange("Carbon Emissions Non-Renewable (%)"),
+    "carbon_emissions": Series(("Carbon Emissions Renewable (%)", "Carbon Emissions Non-Renewable (%)")),
+
+    "energy_usage": Series(("Energy Renewable (%)", "Energy Non-Renewable (%)")),
+    "energy_usage_latest": Template([
+        {"name": "Renewable", "value": Latest("Energy Renewable (%)"), "color": "#10B981"},
+        {"name": "Non-Renewable", "value": Latest("Energy Non-Renewable (%)"), "color": "#EF4444"},
+    ]),
+    "energy_renewable_change": PctChange("Energy Renewable (%)"),
+    "energy_nonrenewable_change": PctChange("Energy Non-Renewable (%)"),
+
+    "safety_data": Template([
+        {"type": "Fatal", "count": Total("Accident Fatal"), "color": "#EF4444"},
+        {"type": "Serious", "count": Total("Accident Serious"), "color": "#F59E0B"},
+        {"type": "Minor", "count": Total("Accident Minor"), "color": "#10B981"},
+    ]),
+
+    "diversity_data": Template([
+        {
+            "category": "Board",
+            "men": Latest("Board members (male) as % of total"),
+            "women": Latest("Board members (female) as % of total"),
+            "minority": Latest("Board members (minority) as % of total"),
+        },
+        {
+            "category": "Management",
+            "men": Latest("Employees in all management positions (male) % annual"),
+            "women": Latest("Employees in all management positions (female) % annual"),
+            "minority": Latest("Employees in all management positions (minority) % annual"),
+        },
+    ]),
+
+    "wellness_data": Series(("Employees covered by collective bargaining Persons annual",)),
+
+    "labor_rights_compliance_score": Score(labor_rights_compliance_score, (
+        "Accident Fatal",
+        "Accident Serious",
+        "Accident Minor",
+        "Employees covered by collective bargaining Persons annual",
+        "Board members (female) as % of total",
+        "Employees in all management positions (female) % annual",
+        "Voluntary Employee Turnover Rate  % annual",
+    )),
+
+    "gender_diversity_board": Template([
+        {"name": "Female", "value": Latest("Board members (female) as % of total"), "color": "#EC4899", "description": "Women board members"},
+        {"name": "Male", "value": Latest("Board members (male) as % of total"), "color": "#3B82F6", "description": "Men board members"},
+        {"name": "Minority", "value": Latest("Board members (minority) as % of total"), "color": "#f6f03bff", "description": "Minority board members"},
+    ]),
+
+    "anti_corruption_training": Share("Employees Trained (Anti-Corruption)", "Total number of employees"),
+
+    "disability_representation": Share("Board members with disabilities", "Total number of employees"),
+
+    "education_diversity_data": Template([
+        {"name": "Business/MBA", "value": Latest("Board education Business", int), "color": "#3B82F6", "description": "Business/MBA background"},
+        {"name": "Law", "value": Latest("Board education Law", int), "color": "#EC4899", "description": "Legal background"},
+        {"name": "Engineering/Tech", "value": Latest("Board education Engineering", int), "color": "#10B981", "description": "Engineering/Technology"},
+        {"name": "Finance", "value": Latest("Board education Finance/Econ", int), "color": "#F59E0B", "description": "Finance background"},
+        {"name": "Other", "value": Latest("Board education Others", int), "color": "#6B7280", "description": "Other educational backgrounds"},
+    ]),
+
+    "age_group_composition": Template([
+        {"name": "30-45", "value": Latest("Age-group composition 30-45", int), "color": "#06B6D4", "description": "Ages 30-45"},
+        {"name": "46-60", "value": Latest("Age-group composition 46-60", int), "color": "#8B5CF6", "description": "Ages 46-60"},
+        {"name": "61+", "value": Latest("Age-group composition 61+", int), "color": "#F59E0B", "description": "Ages 61+"},
+    ]),
+
+    "ethnic_diversity_data": Template([
+        {"name": "Azerbaijani", "value": Latest("Board ethnicity-AZE"), "color": "#8B5CF6", "description": "Azerbaijani"},
+        {"name": "Others", "value": Latest("Board ethnicity-AZE", lambda value: round(100 - value, 1)), "color": "#F59E0B", "description": "Others"},
+    ]),
+
+    "shareholder_rights_data": Series(
+        (
+            "shareholder percentages (broad composition).Pension fund",
+            "shareholder percentages (broad composition). Ataturk shares",
+            "shareholder percentages (broad composition). Free float",
+        ),
+        rename={
+            "shareholder percentages (broad composition).Pension fund": "Pension fund",
+            "shareholder percentages (broad composition). Ataturk shares": "Ataturk shares",
+            "shareholder percentages (broad composition). Free float": "Free float",
+        },
+        scale=100,
+    ),
+}
+
+
+def _template_refs(node):
+    if isinstance(node, (Latest, Total)):
+        yield node
+    elif isinstance(node, dict):
+        for value in node.values():
+            yield from _template_refs(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _template_refs(value)
+
+
+def _spec_columns(spec):
+    if isinstance(spec, PctChange):
+        return {spec.column}
+    if isinstance(spec, (Series, Score)):
+        return set(spec.columns)
+    if isinstance(spec, Share):
+        return {spec.numerator, spec.denominator}
+    return {ref.column for ref in _template_refs(spec.template)}
+
+
+def required_columns(metrics=METRICS):
+    """All workbook columns read by `metrics`, 'Year' included."""
+    columns = {"Year"}
+    for spec in metrics.values():
+        columns |= _spec_columns(spec)
+    return columns
+
+
+def _pct_columns(metrics):
+    return list(dict.fromkeys(spec.column for spec in metrics.values() if isinstance(spec, PctChange)))
+
+
+def _total_columns(metrics):
+    return list(dict.fromkeys(
+        [
+            ref.column
+            for spec in metrics.values() if isinstance(spec, Template)
+            for ref in _template_refs(spec.template) if isinstance(ref, Total)
+        ]
+        + [column for spec in metrics.values() if isinstance(spec, Score) for column in spec.columns]
+    ))
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class MetricContext:
+    """Everything the specs read, computed in bulk from the 'ESG Metrics' frame."""
+
+    def __init__(self, df, metrics=METRICS):
+        pct_columns = _pct_columns(metrics)
+        total_columns = _total_columns(metrics)
+        columns = sorted(required_columns(metrics))
+
+        # One conversion of the projected frame to native Python records serves every series
+        self.rows = df[columns].to_dict(orient='records')
+        self.latest = self.rows[-1]  # assumes chronological order
+        self.years = [row["Year"] for row in self.rows]
+
+        # All pct-changes in one vectorized pass; forward filling matches pandas' legacy pad behaviour
+        filled = df[pct_columns].ffill()
+        self.pct_changes = filled.pct_change(fill_method=None).mul(100).fillna(0).to_dict(orient='list')
+        self.filled = filled.iloc[-1].to_dict()
+
+        self.sums = df[total_columns].sum().to_dict()
+        self.totals = {column: int(total) for column, total in self.sums.items()}
+
+    def state(self):
+        """What append_dashboard_metrics() needs to carry the metrics forward by another year."""
+        return {"latest": self.latest, "filled": self.filled, "sums": self.sums}
+
+
+class AppendContext:
+    """
+    MetricContext for a single year appended after the years summarised in `state`.
+    Pct-changes only need the previous (forward filled) value and totals only the running sums,
+    so the new year is folded in without revisiting the earlier ones.
+    """
+
+    def __init__(self, state, row, metrics=METRICS):
+        # JSON has no NaN, blanks arrive as None and are read as NaN like a blank workbook cell
+        self.rows = [{
+            column: math.nan if row[column] is None else row[column]
+            for column in sorted(required_columns(metrics))
+        }]
+        self.latest = self.rows[0]
+        self.years = [self.latest["Year"]]
+
+        self.filled, self.pct_changes = {}, {}
+        for column in _pct_columns(metrics):
+            previous, value = state["filled"].get(column), self.latest[column]
+            self.filled[column] = previous if _is_missing(value) else value
+            self.pct_changes[column] = [_pct_change(previous, self.filled[column])]
+
+        self.sums = {
+            column: state["sums"].get(column, 0) + (0 if _is_missing(self.latest[column]) else self.latest[column])
+            for column in _total_columns(metrics)
+        }
+        self.totals = {column: int(total) for column, total in self.sums.items()}
+
+    state = MetricContext.state
+
+
+def _pct_change(previous, value):
+    # Same as pandas' pct_change(...).mul(100).fillna(0), so x/0 is still +-inf
+    if _is_missing(previous) or _is_missing(value):
+        return 0
+    if previous == 0:
+        return math.copysign(math.inf, value) if value != 0 else 0
+    return (value / previous - 1) * 100
+
+
+def _resolve(node, ctx):
+    if isinstance(node, Latest):
+        value = ctx.latest[node.column]
+        return node.fn(value) if node.fn else value
+    if isinstance(node, Total):
+        return ctx.totals[node.column]
+    if isinstance(node, dict):
+        return {key: _resolve(value, ctx) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_resolve(value, ctx) for value in node]
+    return node
+
+
+def evaluate(spec, ctx):
+    if isinstance(spec, PctChange):
+        return [
+            {"Year": year, "percentage_change": change}
+            for year, change in zip(ctx.years, ctx.pct_changes[spec.column])
+        ]
+    if isinstance(spec, Series):
+        return [
+            {"Year": row["Year"], **{spec.rename.get(column, column): row[column] * spec.scale for column in spec.columns}}
+            for row in ctx.rows
+        ]
+    if isinstance(spec, Share):
+        return math.floor(100 * (ctx.latest[spec.numerator] / ctx.latest[spec.denominator]))
+    if isinstance(spec, Score):
+        return spec.fn(ctx)
+    return _resolve(spec.template, ctx)
+
+
+def compute_dashboard_metrics(df, metrics=METRICS):
+    return compute_dashboard_snapshot(df, metrics)[0]
+
+
+def compute_dashboard_snapshot(df, metrics=METRICS):
+    """The dashboard payload for `df`, plus the state needed to append later years to it."""
+    with stage("metrics"):
+        ctx = MetricContext(df, metrics)
+        return {key: evaluate(spec, ctx) for key, spec in metrics.items()}, ctx.state()
+
+
+def append_dashboard_metrics(results, state, row, metrics=METRICS):
+    """
+    Extends a dashboard payload computed by compute_dashboard_snapshot() with one more year,
+    `row` mapping columns to its values. The year has to come after every year already in `results`.
+    Returns the new payload and state.
+    """
+    with stage("metrics"):
+        ctx = AppendContext(state, row, metrics)
+        results = {
+            key: results[key] + evaluate(spec, ctx) if isinstance(spec, (PctChange, Series)) else evaluate(spec, ctx)
+            for key, spec in metrics.items()
+        }
+        return results, ctx.state()
+
+
+# --- Cross-company Comparison ---
+
+COMPARISON_COLUMNS = [
+    "Carbon Emissions (tons CO2e)",
+    "Water Usage (m3)",
+    "Waste Recycled (tons)",
+    "Energy Renewable (%)",
+    "Employee Safety (accidents)",
+    "Board members (female) as % of total",
+    "Voluntary Employee Turnover Rate  % annual",
+]
+
+
+def compare_companies(frames, columns=COMPARISON_COLUMNS):
+    """
+    Latest-year values and their year over year change for each company in `frames`.
+    All companies are stacked into one frame, so the changes come out of a single grouped pass.
+    """
+    import numpy as np
+    import pandas as pd
+
+    combined = pd.concat(
+        {company: df.reindex(columns=["Year"] + columns) for company, df in frames.items()},
+        names=["Company"],
+    )
+    by_company = combined.groupby(level="Company", sort=False)
+
+    filled = by_company[columns].ffill()
+    changes = filled.groupby(level="Company", sort=False).pct_change(fill_method=None).mul(100)
+
+    latest = by_company.tail(1)
+    table = latest.join(changes.loc[latest.index].add_suffix(" change (%)")).reset_index(level="Company")
+
+    # Missing columns and single-year companies leave NaN/inf behind, which JSON can't carry
+    table = table.replace([np.inf, -np.inf], np.nan).astype(object)
+    return table.where(table.notna(), None).to_dict(orient='records')
+
+
+# --- Prompt Summary ---
+
+def _format_number(value):
+    return f"{value:,.4g}" if abs(value) < 1e6 else f"{value:,.0f}"
+
+
+def metrics_summary(df):
+    """
+    Compact text summary of every metric for LLM prompts: the latest value, the change from the
+    previous year and the change since the first year. A few lines instead of the raw records.
+    """
+    import numpy as np
+    import pandas as pd
+
+    df = df.set_index("Year")
+    numeric = df.select_dtypes("number")
+    first_year, latest_year = df.index[0], df.index[-1]
+
+    latest = numeric.iloc[-1]
+    year_over_year = (latest / numeric.iloc[-2] - 1) * 100 if len(numeric) > 1 else latest * np.nan
+    overall = (latest / numeric.iloc[0] - 1) * 100
+
+    lines = [f"Metrics {first_year}-{latest_year}, latest values are for {latest_year}:"]
+    for column in numeric.columns:
+        if pd.isna(latest[column]):
+            continue
+
+        line = f"- {column}: {_format_number(latest[column])}"
+        if np.isfinite(year_over_year[column]):
+            line += f" ({year_over_year[column]:+.1f}% y/y"
+            if len(numeric) > 2 and np.isfinite(overall[column]):
+                line += f", {overall[column]:+.1f}% since {first_year}"
+            line += ")"
+        lines.append(line)
+
+    return "\n".join(lines)
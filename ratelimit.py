@@ -0,0 +1,66 @@
+import math
+import os
+import time
+
+from fastapi import HTTPException, Request
+
+from instrumentation import record_rate_limited
+
+
+# Requests per second each client may make to the LLM-backed endpoints, and the burst allowed on top
+LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "0.1"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "5"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+
+
+class RateLimiter:
+    """
+    Per-client token buckets. Each client holds up to `burst` tokens, refilled at `rate` per second,
+    and every request takes one. A client out of tokens is rejected with a 429 and a Retry-After
+    header telling it when the next token is due. A `rate` of 0 disables the limiter.
+
+    Used as a FastAPI dependency. It is async so it runs on the event loop, where acquire() can't
+    interleave with itself, rather than on FastAPI's thread pool. Clients are told apart by their address.
+    """
+
+    def __init__(self, name, rate, burst, max_clients=RATE_LIMIT_MAX_CLIENTS):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = {}
+
+    async def __call__(self, request: Request):
+        if self.rate <= 0:
+            return
+
+        client = request.client.host if request.client else "unknown"
+        retry_after = self.acquire(client)
+        if retry_after:
+            record_rate_limited(self.name)
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests. Please try again shortly.",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    def acquire(self, client):
+        """Takes a token for `client`. Returns 0 on success, otherwise the seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0
+        else:
+            retry_after = max(1, math.ceil((1 - tokens) / self.rate))
+
+        # Re-inserted so the dict stays ordered from least to most recently seen
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.pop(next(iter(self._buckets)))
+        return retry_after
+
+
+llm_rate_limiter = RateLimiter("llm", LLM_RATE_LIMIT, LLM_RATE_BURST)
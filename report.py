@@ -0,0 +1,116 @@
+import functools
+import io
+
+from instrumentation import stage
+from utils import line_chart_spec, bar_chart_spec, pie_chart_spec
+
+
+CHART_COLUMNS = {
+    'Year',
+    'Carbon Emissions (tons CO2e)',
+    'Water Usage (m3)',
+    'Board members (female) as % of total',
+    'Board members (male) as % of total',
+    'Age-group composition 30-45',
+    'Age-group composition 46-60',
+    'Age-group composition 61+',
+    'Energy Renewable (%)',
+    'Energy Non-Renewable (%)',
+    'Accident Minor',
+    'Accident Serious',
+}
+
+
+def report_chart_specs(df):
+    """Chart specs for the report, keyed by the section they are placed in."""
+    charts = {"Environmental": [], "Social": [], "Performance Metrics & Targets": []}
+
+    if 'Year' in df.columns and 'Carbon Emissions (tons CO2e)' in df.columns:
+        charts["Environmental"].append(line_chart_spec(df, 'Year', 'Carbon Emissions (tons CO2e)', 'Total Carbon Emissions Over Time', 'Tons CO2e'))
+    if 'Year' in df.columns and 'Water Usage (m3)' in df.columns:
+        charts["Environmental"].append(line_chart_spec(df, 'Year', 'Water Usage (m3)', 'Water Usage Over Time', 'Cubic Meters (m3)'))
+
+    if 'Board members (female) as % of total' in df.columns and 'Board members (male) as % of total' in df.columns:
+        df_last_year = df.iloc[-1]
+        labels = ['Female', 'Male']
+        sizes = [df_last_year['Board members (female) as % of total'], df_last_year['Board members (male) as % of total']]
+        charts["Social"].append(pie_chart_spec(labels, sizes, 'Board Gender Composition'))
+
+    if 'Age-group composition 30-45' in df.columns and 'Age-group composition 46-60' in df.columns and 'Age-group composition 61+' in df.columns:
+        df_last_year = df.iloc[-1]
+        labels = ['30-45', '46-60', '61+']
+        sizes = [df_last_year['Age-group composition 30-45'], df_last_year['Age-group composition 46-60'], df_last_year['Age-group composition 61+']]
+        charts["Social"].append(pie_chart_spec(labels, sizes, 'Age Group Composition'))
+
+    if 'Year' in df.columns and 'Energy Renewable (%)' in df.columns and 'Energy Non-Renewable (%)' in df.columns:
+        charts["Performance Metrics & Targets"].append(bar_chart_spec(df, 'Year', ['Energy Renewable (%)', 'Energy Non-Renewable (%)'], 'Energy Source Composition Over Time'))
+
+    if 'Year' in df.columns and 'Accident Minor' in df.columns and 'Accident Serious' in df.columns:
+        charts["Performance Metrics & Targets"].append(bar_chart_spec(df, 'Year', ['Accident Minor', 'Accident Serious'], 'Safety Incidents Over Time'))
+
+    return charts
+
+
+@functools.cache
+def releasing_image():
+    """Image flowable that drops its decoded pixels as soon as it has been drawn on the page."""
+    from reportlab.platypus import Image
+
+    class ReleasingImage(Image):
+        def draw(self):
+            super().draw()
+            self.__dict__.pop('_img', None)
+            self._file = None
+
+    return ReleasingImage
+
+
+def build_report_pdf(report_sections, charts, output):
+    """
+    Renders the generated sections into the PDF report, writing it to `output` (a path or file).
+    `charts` maps section titles to the PNG bytes of the charts placed after them.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.platypus.flowables import PageBreak
+
+    ReleasingImage = releasing_image()
+
+    doc = SimpleDocTemplate(output, pagesize=letter)
+    
+    # Define styles for the document
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle('TitleStyle', parent=styles['Heading1'], spaceAfter=12, alignment=TA_CENTER)
+    heading_style = styles['Heading2']
+    paragraph_style = styles['Normal']
+    
+    flowables = []
+    
+    # Title Page
+    flowables.append(Paragraph("ESG Report", title_style))
+    flowables.append(Paragraph("A Comprehensive Analysis", ParagraphStyle('SubTitleStyle', parent=styles['Normal'], alignment=TA_CENTER, fontSize=16)))
+    flowables.append(Spacer(1, 48))
+    flowables.append(PageBreak())
+    
+    # Add sections to the PDF
+    for title, content in report_sections.items():
+        flowables.append(Paragraph(title, heading_style))
+        flowables.append(Spacer(1, 6))
+        
+        # Split content into paragraphs for better formatting
+        for para in content.split('\n'):
+            if para.strip():
+                flowables.append(Paragraph(para.strip(), paragraph_style))
+                flowables.append(Spacer(1, 6))
+        
+        # Add charts for specific sections
+        for png in charts.pop(title, []):
+            flowables.append(ReleasingImage(io.BytesIO(png), width=400, height=300))
+            flowables.append(Spacer(1, 12))
+
+        flowables.append(Spacer(1, 18))
+
+    with stage("pdf"):
+        doc.build(flowables)
@@ -0,0 +1,92 @@
+import gzip
+import os
+
+import brotli
+import orjson
+from fastapi.responses import Response
+
+from metrics import METRICS, PctChange, Series
+
+
+# Payloads smaller than this go out uncompressed, the framing would cost more than it saves
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# In order of preference when the client weighs them equally
+ENCODINGS = ("br", "gzip")
+
+
+def _default(value):
+    # numpy arrays and scalars are handled by orjson itself, this covers what pandas adds on top
+    if value.__class__.__name__ in ("NAType", "NaTType"):
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content):
+    """JSON bytes for `content`. numpy and pandas values are encoded directly and NaN/inf become null."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def to_columnar(results, metrics=METRICS):
+    """
+    Rewrites the year by year series of a dashboard payload from lists of records into one array
+    per column, e.g. {"Year": [...], "Water Usage (m3)": [...]}, so column names appear once.
+    """
+    columnar = dict(results)
+    for key, spec in metrics.items():
+        if isinstance(spec, (PctChange, Series)) and key in results:
+            records = results[key]
+            columns = records[0].keys() if records else ()
+            columnar[key] = {column: [record[column] for record in records] for column in columns}
+    return columnar
+
+
+def negotiate_encoding(accept_encoding):
+    """Picks br or gzip from an Accept-Encoding header, None for an uncompressed response."""
+    offered = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+
+    candidates = [name for name in ENCODINGS if offered.get(name, offered.get("*", 0)) > 0]
+    return max(candidates, key=lambda name: offered.get(name, offered.get("*", 0)), default=None)
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+class DashboardResponse(Response):
+    """
+    orjson encoded JSON response, compressed with br or gzip when the client accepts it.
+    Returned directly from endpoints, so FastAPI's jsonable_encoder pass is skipped.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content, accept_encoding="", status_code=200, headers=None):
+        body = dumps(content)
+        headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+
+        encoding = negotiate_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_BYTES else None
+        if encoding is not None:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+
+        super().__init__(body, status_code=status_code, headers=headers)
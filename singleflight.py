@@ -0,0 +1,74 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from instrumentation import record_single_flight
+
+
+class Flight:
+    def __init__(self, task, release):
+        self.task = task
+        self.release = release
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one in-flight computation.
+
+    The first caller for a key starts `fn()`, callers arriving while it runs wait on the same task
+    and all receive its result (or exception). Once it finishes the key is free again, later
+    calls start a new computation. Keys are tuples whose first item names the kind of work.
+
+    A caller giving up doesn't cancel the computation, the others may still be waiting on it.
+    """
+
+    def __init__(self):
+        self._flights = {}
+
+    async def run(self, key, fn):
+        """Returns the result of the in-flight `fn()` for `key`, starting it if there is none."""
+        async with self.join(key, fn) as result:
+            return result
+
+    @asynccontextmanager
+    async def join(self, key, fn, release=None):
+        """
+        Like run(), but yields the result for the duration of the block. `release(result)` is called
+        once the computation has finished and every caller has left its block, e.g. to remove a
+        file they all read from.
+        """
+        flight = self._flights.get(key)
+        record_single_flight(key[0], flight is not None)
+        if flight is None:
+            flight = self._start(key, fn, release)
+
+        flight.waiters += 1
+        try:
+            yield await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            self._release_if_done(flight)
+
+    def _start(self, key, fn, release):
+        flight = Flight(asyncio.ensure_future(fn()), release)
+        self._flights[key] = flight
+
+        def done(task):
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            self._release_if_done(flight)
+
+        flight.task.add_done_callback(done)
+        return flight
+
+    @staticmethod
+    def _release_if_done(flight):
+        task = flight.task
+        if flight.waiters or not task.done() or flight.release is None:
+            return
+        if not task.cancelled() and task.exception() is None:
+            release, flight.release = flight.release, None
+            release(task.result())
+
+
+single_flight = SingleFlight()
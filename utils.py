@@ -1,51 +1,112 @@
-import matplotlib.pyplot as plt
+import hashlib
 import io
+import json
+
+from instrumentation import stage
 
 
 # --- Chart Generation Functions ---
-def create_line_chart(df, x_col, y_col, title, ylabel):
-    """Generates a line chart from a DataFrame."""
-    plt.figure(figsize=(6, 4))
-    plt.plot(df[x_col], df[y_col], marker='o')
-    plt.title(title)
-    plt.xlabel(x_col)
-    plt.ylabel(ylabel)
-    plt.grid(True)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+#
+# Charts are drawn with the object-oriented Figure API on the Agg canvas rather than through
+# pyplot, so there is no global figure state and several charts can render at once. matplotlib
+# is imported on first render, keeping it out of the app's startup.
+
+def _new_figure():
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6, 4))
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def _to_png(fig):
+    fig.tight_layout()
     buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
+    fig.savefig(buf, format='png')
     buf.seek(0)
     return buf
 
 
+def create_line_chart(df, x_col, y_col, title, ylabel):
+    """Generates a line chart from a DataFrame."""
+    return render_chart(line_chart_spec(df, x_col, y_col, title, ylabel))
+
+
 def create_bar_chart(df, x_col, y_cols, title):
     """Generates a bar chart from a DataFrame."""
-    plt.figure(figsize=(6, 4))
-    df.set_index(x_col)[y_cols].plot(kind='bar', ax=plt.gca())
-    plt.title(title)
-    plt.xlabel(x_col)
-    plt.ylabel("Percentage (%)")
-    plt.xticks(rotation=0)
-    plt.legend(title="Type")
-    plt.tight_layout()
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
-    return buf
+    return render_chart(bar_chart_spec(df, x_col, y_cols, title))
 
 
 def create_pie_chart(labels, sizes, title):
     """Generates a pie chart."""
-    plt.figure(figsize=(6, 4))
-    plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-    plt.title(title)
-    plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
-    plt.tight_layout()
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
-    return buf
+    return render_chart(pie_chart_spec(labels, sizes, title))
+
+
+# --- Chart Specs ---
+#
+# A spec is a plain dict holding the chart type, its labels and the data to plot. Specs are
+# cheap to build, picklable for the worker pool and hashable into a cache key.
+
+def line_chart_spec(df, x_col, y_col, title, ylabel):
+    return {"type": "line", "title": title, "xlabel": x_col, "ylabel": ylabel,
+            "x": df[x_col].tolist(), "y": df[y_col].tolist()}
+
+
+def bar_chart_spec(df, x_col, y_cols, title):
+    return {"type": "bar", "title": title, "xlabel": x_col, "ylabel": "Percentage (%)",
+            "x": df[x_col].tolist(), "series": {col: df[col].tolist() for col in y_cols}}
+
+
+def pie_chart_spec(labels, sizes, title):
+    return {"type": "pie", "title": title, "labels": list(labels), "sizes": [float(size) for size in sizes]}
+
+
+def chart_key(spec):
+    """Cache key covering both the chart's presentation and the data it plots."""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=float).encode()).hexdigest()
+
+
+def render_chart(spec):
+    """Renders a chart spec, returning a PNG buffer."""
+    with stage(f"chart_{spec['type']}"):
+        return _render_chart(spec)
+
+
+def _render_chart(spec):
+    import numpy as np
+
+    fig, ax = _new_figure()
+
+    if spec["type"] == "line":
+        ax.plot(spec["x"], spec["y"], marker='o')
+        ax.grid(True)
+        ax.tick_params(axis='x', labelrotation=45)
+
+    elif spec["type"] == "bar":
+        # Grouped bars laid out the way pandas' DataFrame.plot(kind='bar') does
+        positions = np.arange(len(spec["x"]))
+        width = 0.5 / len(spec["series"])
+        for i, (label, values) in enumerate(spec["series"].items()):
+            ax.bar(positions + (i - (len(spec["series"]) - 1) / 2) * width, values, width, label=label)
+        ax.set_xticks(positions, [str(x) for x in spec["x"]], rotation=0)
+        ax.legend(title="Type")
+
+    elif spec["type"] == "pie":
+        ax.pie(spec["sizes"], labels=spec["labels"], autopct='%1.1f%%', startangle=90)
+        ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+
+    else:
+        raise ValueError(f"Unknown chart type: {spec['type']}")
+
+    ax.set_title(spec["title"])
+    if "xlabel" in spec:
+        ax.set_xlabel(spec["xlabel"])
+        ax.set_ylabel(spec["ylabel"])
+
+    return _to_png(fig)
+
+
+def render_charts_png(specs):
+    """Worker pool entry point, renders a batch of specs to PNG bytes."""
+    return [render_chart(spec).getvalue() for spec in specs]
@@ -0,0 +1,33 @@
+import io
+import os
+
+
+# Runs warm_up() during startup, before the app accepts requests, e.g. ahead of a readiness probe
+WARMUP = os.getenv("WARMUP", "false").lower() in ("1", "true", "yes")
+
+
+def warm_up():
+    """
+    Pays the first-use costs of the heavy libraries: imports pandas, openpyxl and google.genai,
+    builds matplotlib's font cache and Agg backend by rendering the report charts, and loads
+    reportlab's fonts and styles by building a small PDF. Runs the same metrics, chart and PDF
+    code as a real upload, on a two year frame holding every column the API reads.
+    """
+    import pandas as pd
+    import openpyxl  # noqa: F401
+    from google.genai import types  # noqa: F401
+
+    from ingest import INGEST_COLUMNS
+    from metrics import compute_dashboard_metrics, metrics_summary
+    from report import report_chart_specs, build_report_pdf
+    from utils import render_charts_png
+
+    df = pd.DataFrame({column: [50.0, 60.0] for column in sorted(INGEST_COLUMNS - {"Year"})})
+    df.insert(0, "Year", [2020, 2021])
+    compute_dashboard_metrics(df)
+    metrics_summary(df)
+
+    specs = report_chart_specs(df)
+    pngs = iter(render_charts_png([spec for section in specs.values() for spec in section]))
+    charts = {title: [next(pngs) for _ in section] for title, section in specs.items()}
+    build_report_pdf({title: "Warm-up paragraph." for title in charts}, charts, io.BytesIO())
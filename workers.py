@@ -0,0 +1,83 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+from instrumentation import WORKER_PENDING, run_collecting_stages, record_stage
+
+
+# WORKER_PROCESSES=0 runs the stages on a thread pool instead, e.g. for local development
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(os.cpu_count() or 1)))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", str(max(WORKER_PROCESSES, 1) * 4)))
+WORKER_RETRY_AFTER = int(os.getenv("WORKER_RETRY_AFTER", "5"))
+
+
+class WorkerPool:
+    """
+    Runs CPU-bound stages (Excel parsing, metrics, charts, PDF rendering) off the event loop.
+
+    At most `queue_size` jobs may be running or waiting at once. Beyond that new jobs are
+    rejected with a 503 and a Retry-After header rather than piling up behind the pool.
+    """
+
+    def __init__(self, processes=WORKER_PROCESSES, queue_size=WORKER_QUEUE_SIZE, retry_after=WORKER_RETRY_AFTER):
+        self.processes = processes
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.processes > 0:
+                # spawn rather than fork, the event loop process is multi-threaded
+                self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(thread_name_prefix="esg-worker")
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.queue_size:
+            raise HTTPException(
+                status_code=503,
+                detail="The server is busy processing other files. Please try again shortly.",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        self.pending += 1
+        executor = self.executor
+        try:
+            loop = asyncio.get_running_loop()
+            result, stages = await loop.run_in_executor(executor, functools.partial(run_collecting_stages, fn, args))
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM killed), fail the jobs it took down but start a fresh pool for the next ones
+            if self._executor is executor:
+                self.shutdown()
+            raise
+        finally:
+            self.pending -= 1
+
+        # Stages timed inside the worker are recorded here, where the metrics are served from
+        for name, seconds in stages:
+            record_stage(name, seconds)
+        return result
+
+    async def warm(self, fn):
+        """Starts the worker processes and runs `fn` in them, ahead of the first request."""
+        if self.processes > 0:
+            # Concurrent jobs make the executor spawn every process, each then picks up one job
+            await asyncio.gather(*(self.run(fn) for _ in range(self.processes)))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+worker_pool = WorkerPool()
+WORKER_PENDING.set_function(lambda: worker_pool.pending)